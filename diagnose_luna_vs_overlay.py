@@ -2,6 +2,7 @@
 import os, json, re
 from datetime import datetime, timezone
 import swisseph as swe
+import ephem_cache
 
 EPHE_CAND = (
     '/home/DAC/Zet9 GeoDAC/Swiss',
@@ -55,18 +56,24 @@ def parse_iso(s):
             dt = dt.replace(tzinfo=timezone.utc)
     return dt
 
+_PC = None   # ephem_cache.PositionCache после первого расчёта
+
 def moon_lon(dt):
     # Переводим момент в UTC и считаем jd
+    used = None
     for ephe in EPHE_CAND:
         if os.path.exists(ephe):
             swe.set_ephe_path(ephe)
+            used = ephe
             break
     dt_utc = dt.astimezone(timezone.utc)
     y, m, d = dt_utc.year, dt_utc.month, dt_utc.day
     h = dt_utc.hour + dt_utc.minute/60 + dt_utc.second/3600
     jd = swe.julday(y, m, d, h)
-    pos, _ = swe.calc_ut(jd, swe.MOON, swe.FLG_SWIEPH)
-    return norm(pos[0])
+    # события с одинаковым пиком — из LRU-кэша
+    global _PC
+    _PC = ephem_cache.open_cache(used, swe.FLG_SWIEPH)
+    return norm(_PC.lon(jd, swe.MOON))
 
 def reported_tr_house(ev):
     # 1) из поля houses.tr
@@ -133,6 +140,8 @@ def main():
     print(f"Total lunar aspects (non-axis): {total}; OK={total - mism}; MISM={mism}; ACC={acc:.1f}%")
     for s, t, rep, calc in mismlist:
         print(f"- {s} @ {t} | event H{rep} vs calc H{calc}")
+    if _PC is not None:
+        print(_PC.summary())
 
 if __name__ == '__main__':
     main()
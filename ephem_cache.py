@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Мемо-слой позиций: LRU-кэш (jd квантованный, тело, флаги) -> (долгота, скорость).
+#
+# Повторные моменты (узлы бракетов refine, границы интервалов bisect, одинаковые
+# пики в rehouse/diagnose) стоят поиска в dict вместо calc_ut / Кленшоу по таблице.
+# По умолчанию ключ — точный jd (результаты бит-в-бит как без кэша); с разрешением
+# > 0 моменты ближе RES_S секунд делят одно значение, посчитанное в квантованной
+# точке — результат не зависит от того, кто спросил первым.
+#
+#   GEODAC_EPHEM_CACHE=0          — выключить (сквозной вызов)
+#   GEODAC_EPHEM_CACHE_RES=0      — разрешение по времени, секунды (0 — точный jd)
+#   GEODAC_EPHEM_CACHE_SIZE=65536 — максимум записей
+import os
+from collections import OrderedDict
+import swisseph as swe
+import ephem_table
+
+RES_S = float(os.environ.get('GEODAC_EPHEM_CACHE_RES', 0))
+MAXSIZE = int(os.environ.get('GEODAC_EPHEM_CACHE_SIZE', 65536))
+
+def enabled():
+    return os.environ.get('GEODAC_EPHEM_CACHE', '1') not in ('0', 'no', 'off', '')
+
+class PositionCache:
+    """lon_speed(jd, pid) через LRU; источник — ephem_table (если включены) или calc_ut."""
+    def __init__(self, ephe=None, flags=swe.FLG_SWIEPH, res_s=RES_S, maxsize=MAXSIZE, tables=True):
+        self.flags = int(flags) | swe.FLG_SPEED
+        self.et = ephem_table.open_tables(ephe, flags) if tables else None
+        self.q = res_s / 86400.0
+        self.maxsize = maxsize if enabled() else 0
+        self.data = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def lon_speed(self, jd, pid):
+        if self.q:
+            n = round(jd / self.q)
+            key = (n, pid, self.flags); jd = n * self.q
+        else:
+            key = (jd, pid, self.flags)
+        v = self.data.get(key)
+        if v is not None:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return v
+        self.misses += 1
+        if self.et is not None:
+            v = self.et.lon_speed(jd, pid)
+        else:
+            pos, _ = swe.calc_ut(jd, pid, self.flags)
+            v = (pos[0] % 360.0, pos[3])
+        if self.maxsize:
+            self.data[key] = v
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False); self.evictions += 1
+        return v
+
+    def lon(self, jd, pid):
+        return self.lon_speed(jd, pid)[0]
+
+    def clear(self):
+        self.data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        n = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.data),
+                "hit_rate": round(self.hits / n, 4) if n else 0.0}
+
+    def summary(self):
+        s = self.stats()
+        return f"[cache] hits={s['hits']} misses={s['misses']} hit_rate={s['hit_rate']:.1%} size={s['size']}"
+
+_OPEN = {}
+def open_cache(ephe=None, flags=swe.FLG_SWIEPH):
+    """Общий кэш на (ephe, flags, таблицы вкл/выкл) в пределах процесса."""
+    key = (ephe or '', int(flags) | swe.FLG_SPEED, ephem_table.enabled())
+    c = _OPEN.get(key)
+    if c is None:
+        c = _OPEN[key] = PositionCache(ephe, flags)
+    return c
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Предрасчитанные таблицы эфемерид (Чебышёв по сегментам) в mmap-файлах.
+#
+# Каждое тело семплируется один раз на блок времени (BLOCK_DAYS), коэффициенты
+# долготы и скорости пишутся в бинарный файл; дальше любой скрипт/процесс читает
+# их через mmap (общий page cache), а calc_ut остаётся только для построения.
+#
+# Раскладка:  ~/astro/.cache/ephem/<key>/<pid>_<block>.tbl
+#   key   = sha1(ephe path | flags | версия формата | ncoef)
+#   файл  = заголовок HDR + float64[nseg][2][NCOEF] (lon-коэфф., speed-коэфф.)
+#
+# В заголовке — эфемерида, которую swisseph реально использовал (retflags calc_ut):
+# без .se1 он молча считает по Moshier. При загрузке блок сверяется с тем, что
+# calc_ut даёт сейчас; не совпало (файлы Swiss поставили/убрали) — блок пересобирается.
+import os, sys, mmap, math, struct, hashlib, argparse
+import swisseph as swe
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+CACHE_DIR = os.path.expanduser(os.environ.get('GEODAC_EPHEM_DIR', '~/astro/.cache/ephem'))
+BLOCK_DAYS = float(os.environ.get('GEODAC_EPHEM_BLOCK_DAYS', 128))
+NCOEF = 13
+J2000 = 2451545.0
+MAGIC = b'GDEPHT1\0'
+HDR = struct.Struct('<8sIidddIII')   # magic, version, pid, jd0, jd1, seg_days, ncoef, nseg, src
+VERSION = 2
+EPH_MASK = swe.FLG_JPLEPH | swe.FLG_SWIEPH | swe.FLG_MOSEPH
+
+# длина сегмента (дни) по телу: чем быстрее/«кривее» движение, тем короче
+SEG_DAYS = {
+    swe.MOON: 2.0, swe.TRUE_NODE: 2.0, swe.MEAN_NODE: 8.0,
+    swe.SUN: 8.0, swe.MERCURY: 4.0, swe.VENUS: 8.0, swe.MARS: 8.0,
+    swe.JUPITER: 32.0, swe.SATURN: 32.0, swe.URANUS: 32.0,
+    swe.NEPTUNE: 32.0, swe.PLUTO: 32.0,
+}
+
+def enabled():
+    return os.environ.get('GEODAC_EPHEM_TABLE', '1') not in ('0', 'no', 'off', '')
+
+def table_key(ephe, flags):
+    base = f"{ephe or ''}|{int(flags) | swe.FLG_SPEED}|v{VERSION}|n{NCOEF}"
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()[:16]
+
+def _cheb_fit(vals):
+    # vals — значения в узлах x_k = cos(pi*(k+0.5)/N), k=0..N-1
+    N = len(vals); c = []
+    for j in range(N):
+        s = 0.0
+        for k in range(N):
+            s += vals[k] * math.cos(math.pi * j * (k + 0.5) / N)
+        c.append(2.0 * s / N)
+    c[0] *= 0.5
+    return c
+
+def _clenshaw(c, x):
+    b1 = b2 = 0.0; x2 = 2.0 * x
+    for j in range(len(c) - 1, 0, -1):
+        b1, b2 = x2 * b1 - b2 + c[j], b1
+    return x * b1 - b2 + c[0]
+
+def build_block(path, pid, block, flags, block_days=BLOCK_DAYS, ncoef=NCOEF):
+    """Семплирует тело pid на блоке и атомарно пишет файл таблицы."""
+    seg = SEG_DAYS.get(pid, 4.0)
+    jd0 = J2000 + block * block_days
+    nseg = int(math.ceil(block_days / seg))
+    jd1 = jd0 + nseg * seg
+    flags = int(flags) | swe.FLG_SPEED
+    nodes = [math.cos(math.pi * (k + 0.5) / ncoef) for k in range(ncoef)]
+    out = []; src = 0
+    for s in range(nseg):
+        a = jd0 + s * seg
+        lons = []; spds = []
+        for x in nodes:
+            pos, ret = swe.calc_ut(a + (x + 1.0) * 0.5 * seg, pid, flags)
+            lons.append(pos[0]); spds.append(pos[3]); src |= ret & EPH_MASK
+        # разворачиваем долготу по времени (узлы идут от конца сегмента к началу)
+        for k in range(ncoef - 2, -1, -1):
+            d = (lons[k] - lons[k + 1] + 180.0) % 360.0 - 180.0
+            lons[k] = lons[k + 1] + d
+        out.extend(_cheb_fit(lons)); out.extend(_cheb_fit(spds))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(HDR.pack(MAGIC, VERSION, pid, jd0, jd1, seg, ncoef, nseg, src))
+        f.write(struct.pack(f'<{len(out)}d', *out))
+    os.replace(tmp, path)   # параллельные сборщики безопасны: побеждает последний целый файл
+
+class _Block:
+    __slots__ = ('mm', 'coef', 'jd0', 'jd1', 'seg', 'ncoef', 'nseg', 'src', 'arr')
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, ver, _pid, self.jd0, self.jd1, self.seg, self.ncoef, self.nseg, self.src = HDR.unpack_from(self.mm, 0)
+        if magic != MAGIC or ver != VERSION:
+            raise ValueError(f"bad ephem table: {path}")
+        self.coef = memoryview(self.mm)[HDR.size:].cast('d')
+        self.arr = None
+
+    def lon_speed(self, jd):
+        s = max(0, min(int((jd - self.jd0) / self.seg), self.nseg - 1))
+        a = self.jd0 + s * self.seg
+        x = 2.0 * (jd - a) / self.seg - 1.0
+        n = self.ncoef; o = s * 2 * n
+        c = self.coef
+        return _clenshaw(c[o:o + n], x) % 360.0, _clenshaw(c[o + n:o + 2 * n], x)
+
+    def lon_speed_many(self, jd):
+        # векторный Кленшоу по массиву моментов (numpy)
+        if self.arr is None:
+            self.arr = np.frombuffer(self.mm, dtype='<f8', offset=HDR.size).reshape(self.nseg, 2, self.ncoef)
+        s = np.clip(((jd - self.jd0) / self.seg).astype(np.int64), 0, self.nseg - 1)
+        x = 2.0 * (jd - (self.jd0 + s * self.seg)) / self.seg - 1.0
+        C = self.arr[s]
+        res = []
+        for part in (0, 1):
+            b1 = np.zeros_like(x); b2 = np.zeros_like(x)
+            for j in range(self.ncoef - 1, 0, -1):
+                b1, b2 = 2.0 * x * b1 - b2 + C[:, part, j], b1
+            res.append(x * b1 - b2 + C[:, part, 0])
+        return np.mod(res[0], 360.0), res[1]
+
+class EphemTables:
+    """Lookup долготы/скорости по таблицам; отсутствующие блоки строятся по требованию."""
+    def __init__(self, ephe=None, flags=swe.FLG_SWIEPH, root=CACHE_DIR, block_days=BLOCK_DAYS):
+        self.ephe = ephe or ''
+        self.flags = int(flags) | swe.FLG_SPEED
+        self.block_days = float(block_days)
+        self.dir = os.path.join(root, table_key(self.ephe, self.flags))
+        self._blocks = {}
+
+    def _block(self, pid, jd):
+        b = int(math.floor((jd - J2000) / self.block_days))
+        blk = self._blocks.get((pid, b))
+        if blk is None:
+            path = os.path.join(self.dir, f"{pid}_{b}.tbl")
+            if self.ephe: swe.set_ephe_path(self.ephe)
+            # какая эфемерида сейчас доступна для тела на этом блоке (один calc_ut)
+            src = swe.calc_ut(J2000 + (b + 0.5) * self.block_days, pid, self.flags)[1] & EPH_MASK
+            blk = _Block(path) if os.path.exists(path) else None
+            if blk is None or blk.src != src:
+                if blk is not None:
+                    print(f"[ephem] {os.path.basename(path)}: built with eph flags {blk.src}, now {src} — rebuilding",
+                          file=sys.stderr)
+                build_block(path, pid, b, self.flags, self.block_days)
+                blk = _Block(path)
+            self._blocks[(pid, b)] = blk
+        return blk
+
+    def lon_speed(self, jd, pid):
+        return self._block(pid, jd).lon_speed(jd)
+
+    def lon(self, jd, pid):
+        return self._block(pid, jd).lon_speed(jd)[0]
+
+    def lon_speed_many(self, jds, pid):
+        """Векторный вариант: jds — массив JD (UT); нужен numpy."""
+        if np is None:
+            raise RuntimeError("numpy is required for lon_speed_many")
+        jds = np.asarray(jds, dtype=float)
+        lon = np.empty_like(jds); spd = np.empty_like(jds)
+        blk_idx = np.floor((jds - J2000) / self.block_days).astype(np.int64)
+        for b in np.unique(blk_idx):
+            m = blk_idx == b
+            blk = self._block(pid, J2000 + (int(b) + 0.5) * self.block_days)
+            lon[m], spd[m] = blk.lon_speed_many(jds[m])
+        return lon, spd
+
+    def prebuild(self, jd0, jd1, pids):
+        b0 = int(math.floor((jd0 - J2000) / self.block_days))
+        b1 = int(math.floor((jd1 - J2000) / self.block_days))
+        for pid in pids:
+            for b in range(b0, b1 + 1):
+                self._block(pid, J2000 + (b + 0.5) * self.block_days)
+        return len(pids) * (b1 - b0 + 1)
+
+_OPEN = {}
+def open_tables(ephe=None, flags=swe.FLG_SWIEPH):
+    """Общий экземпляр таблиц на (ephe, flags); None, если таблицы отключены (GEODAC_EPHEM_TABLE=0)."""
+    if not enabled(): return None
+    key = (ephe or '', int(flags) | swe.FLG_SPEED)
+    t = _OPEN.get(key)
+    if t is None:
+        t = _OPEN[key] = EphemTables(ephe, flags)
+    return t
+
+def main():
+    ap = argparse.ArgumentParser(description="Prebuild memory-mapped ephemeris tables")
+    ap.add_argument('--ephe', default='/home/DAC/Zet9 GeoDAC/Swiss', help='Path to Swiss ephemeris')
+    ap.add_argument('--bodies', default='Sun,Moon,Mercury,Venus,Mars,Jupiter,Saturn,Uranus,Neptune,Pluto,NNode')
+    ap.add_argument('start', help='Start date YYYY-MM-DD (UT)')
+    ap.add_argument('end', help='End date YYYY-MM-DD (UT)')
+    args = ap.parse_args()
+    names = {
+        "Sun": swe.SUN, "Mercury": swe.MERCURY, "Venus": swe.VENUS, "Mars": swe.MARS,
+        "Jupiter": swe.JUPITER, "Saturn": swe.SATURN, "Uranus": swe.URANUS,
+        "Neptune": swe.NEPTUNE, "Pluto": swe.PLUTO, "NNode": swe.TRUE_NODE, "Moon": swe.MOON
+    }
+    pids = []
+    for nm in (s.strip() for s in args.bodies.split(',') if s.strip()):
+        if nm not in names: raise SystemExit(f"Unknown body: {nm}")
+        pids.append(names[nm])
+    swe.set_ephe_path(args.ephe)
+    jd0 = swe.julday(*map(int, args.start.split('-')), 0.0)
+    jd1 = swe.julday(*map(int, args.end.split('-')), 0.0)
+    t = EphemTables(args.ephe)
+    n = t.prebuild(jd0, jd1, pids)
+    print(f"[ephem] {n} blocks ready in {t.dir}")
+
+if __name__ == '__main__':
+    main()
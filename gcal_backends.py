@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Бэкенды синхронизации для push_gcal.
+#
+# Движок push_gcal (plan_ops / Sender / Mirror) работает с подмножеством Calendar v3:
+#   calendarList().list, calendars().insert,
+#   events().list (pageToken, syncToken, timeMin/timeMax, privateExtendedProperty),
+#   events().get / insert / update / delete, new_batch_http_request(callback).add/execute.
+# Всё, что реализует этот интерфейс, — бэкенд:
+#   google            — googleapiclient (push_gcal.ensure_service)
+#   fake[:k=v,...]    — in-memory Calendar: latency=с на HTTP-запрос, errors=доля
+#                       упавших подзапросов, batch_errors=доля упавших batch целиком,
+#                       status=429/500/503/403 (через /), seed, page
+#   local:DIR         — тот же fake, сохранённый в DIR: <id>.json (состояние) + <id>.ics
+import os, sys, json, time, random, threading, hashlib, functools
+import intervals
+
+try:
+    import httplib2
+    from googleapiclient.errors import HttpError
+except ImportError:   # без googleapiclient fake всё равно работает, ошибки — RuntimeError
+    httplib2 = HttpError = None
+
+REASONS = {429: 'rateLimitExceeded', 403: 'userRateLimitExceeded', 500: 'backendError', 503: 'backendError',
+           404: 'notFound', 410: 'fullSyncRequired'}
+
+def http_error(status, msg=''):
+    """Ошибка в форме googleapiclient (resp.status + JSON с reason) — как от настоящего API."""
+    content = json.dumps({'error': {'code': status, 'message': msg or REASONS.get(status, ''),
+                                    'errors': [{'reason': REASONS.get(status, 'invalid')}]}}).encode()
+    if HttpError is None:
+        return RuntimeError(f"HTTP {status}: {content.decode()}")
+    return HttpError(httplib2.Response({'status': status}), content)
+
+class _Req:
+    def __init__(self, cal, fn): self.cal = cal; self.fn = fn
+    def execute(self, http=None, num_retries=0):
+        self.cal._roundtrip()
+        return self.cal._call(self.fn)
+
+class _Batch:
+    def __init__(self, cal, callback): self.cal = cal; self.cb = callback; self.reqs = []
+    def add(self, req, callback=None, request_id=None):
+        self.reqs.append((request_id or str(len(self.reqs)), req, callback or self.cb))
+    def execute(self, http=None):
+        self.cal._roundtrip(batch=True)
+        for rid, req, cb in self.reqs:
+            try: resp, exc = self.cal._call(req.fn), None
+            except Exception as e: resp, exc = None, e
+            if cb: cb(rid, resp, exc)
+
+class FakeCalendar:
+    """In-memory Calendar v3: пагинация, syncToken с tombstone'ами удалённых,
+    фильтр по private extended property, окно timeMin/timeMax, batch.
+    latency — задержка на каждый HTTP-запрос (batch — один запрос), вне блокировки,
+    так что параллельные потоки её перекрывают; errors/batch_errors — инъекция
+    ошибок статусов status. calls — число HTTP-запросов, items — подзапросов."""
+    def __init__(self, latency=0.0, errors=0.0, batch_errors=0.0, status=(429, 500, 503), seed=None, page=2500):
+        self.cals = {}; self.page = page; self.seq = 0
+        self.ver = 0; self.changed = {}   # (cal, id) -> версия изменения (для syncToken)
+        self.latency = float(latency); self.errors = float(errors); self.batch_errors = float(batch_errors)
+        self.status = tuple(status); self.rnd = random.Random(seed)
+        self.calls = self.items = self.injected = 0
+        self.lock = threading.RLock()
+        self.mirror_root = self.backup_root = None   # push_gcal: зеркало и бэкапы для in-memory не ведём
+
+    # --- транспорт ---
+    def _roundtrip(self, batch=False):
+        with self.lock:
+            self.calls += 1
+            fail = batch and self.batch_errors and self.rnd.random() < self.batch_errors
+            if fail: self.injected += 1; st = self.rnd.choice(self.status)
+        if self.latency: time.sleep(self.latency)
+        if fail: raise http_error(st, 'injected batch failure')
+
+    def _call(self, fn):
+        with self.lock:
+            self.items += 1
+            if self.errors and self.rnd.random() < self.errors:
+                self.injected += 1
+                raise http_error(self.rnd.choice(self.status), 'injected')
+            return fn()
+
+    def new_batch_http_request(self, callback=None): return _Batch(self, callback)
+    def calendarList(self): return self
+    def calendars(self): return self
+    def events(self): return self
+
+    # --- состояние ---
+    def _touch(self, cal, eid):
+        self.ver += 1; self.changed[(cal, eid)] = self.ver
+
+    def _events(self, cal_id):
+        if cal_id not in self.cals: raise http_error(404, f'calendar {cal_id}')
+        return self.cals[cal_id]['events']
+
+    def list(self, calendarId=None, pageToken=None, maxResults=None, timeMin=None, timeMax=None, syncToken=None,
+             privateExtendedProperty=None, **kw):
+        if calendarId is None:   # calendarList().list
+            return _Req(self, lambda: {'items': [{'id': k, 'summary': v['summary']} for k, v in self.cals.items()]})
+        def run():
+            evs = self._events(calendarId)
+            if syncToken is not None:
+                since = int(syncToken)
+                if since > self.ver: raise http_error(410)
+                ids = [i for (c, i), v in self.changed.items() if c == calendarId and v > since]
+                items = [evs.get(i) or {'id': i, 'status': 'cancelled'} for i in ids]
+            else:
+                tz = self.cals[calendarId].get('timeZone')
+                items = sorted(evs.values(), key=lambda e: when(e['start'], tz))
+                if timeMin:
+                    t = intervals.parse_utc(timeMin); items = [e for e in items if when(e['end'], tz) > t]
+                if timeMax:
+                    t = intervals.parse_utc(timeMax); items = [e for e in items if when(e['start'], tz) < t]
+            if privateExtendedProperty:
+                k, _, v = privateExtendedProperty.partition('=')
+                items = [e for e in items if e.get('status') == 'cancelled'
+                         or (e.get('extendedProperties') or {}).get('private', {}).get(k) == v]
+            i = int(pageToken or 0); n = min(maxResults or self.page, self.page)
+            resp = {'items': items[i:i+n]}
+            if i + n < len(items): resp['nextPageToken'] = str(i + n)
+            else: resp['nextSyncToken'] = str(self.ver)
+            return resp
+        return _Req(self, run)
+
+    def insert(self, calendarId=None, body=None, **kw):
+        def run():
+            if calendarId is None:   # calendars().insert
+                cid = f"cal{len(self.cals)}"
+                self.cals[cid] = {'summary': body['summary'], 'timeZone': body.get('timeZone'), 'events': {}}
+                self._dirty(cid)
+                return {'id': cid}
+            self.seq += 1
+            ev = dict(body, id=f"ev{self.seq}", status='confirmed', etag=f'"{self.ver + 1}"')
+            self._events(calendarId)[ev['id']] = ev
+            self._touch(calendarId, ev['id']); self._dirty(calendarId)
+            return ev
+        return _Req(self, run)
+
+    def get(self, calendarId, eventId, **kw):
+        def run():
+            evs = self._events(calendarId)
+            if eventId not in evs: raise http_error(404, f'event {eventId}')
+            return dict(evs[eventId])
+        return _Req(self, run)
+
+    def update(self, calendarId, eventId, body, **kw):
+        def run():
+            evs = self._events(calendarId)
+            if eventId not in evs: raise http_error(404, f'event {eventId}')
+            ev = evs[eventId] = dict(body, id=eventId, status='confirmed', etag=f'"{self.ver + 1}"')
+            self._touch(calendarId, eventId); self._dirty(calendarId)
+            return ev
+        return _Req(self, run)
+
+    def delete(self, calendarId, eventId, **kw):
+        def run():
+            evs = self._events(calendarId)
+            if eventId not in evs: raise http_error(410, f'event {eventId} deleted')
+            del evs[eventId]
+            self._touch(calendarId, eventId); self._dirty(calendarId)
+            return ''
+        return _Req(self, run)
+
+    def _dirty(self, cal_id): pass
+    def flush(self): pass
+
+    def summary(self):
+        n = sum(len(c['events']) for c in self.cals.values())
+        return f"[fake] calendars={len(self.cals)} events={n} http={self.calls} items={self.items} injected={self.injected}"
+
+def ics_escape(s):
+    return str(s).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+@functools.lru_cache(maxsize=1 << 17)
+def _utc(value, tzname):
+    return intervals.parse_utc(value, tzname)
+
+def when(t, tzname=None):
+    """start/end события -> aware UTC datetime: наивное dateTime — в зоне события (timeZone),
+    иначе календаря tzname, иначе UTC (как у API, а не в зоне хоста). Разбор — через LRU
+    по (время, зона): list сортирует/фильтрует весь календарь на каждой странице."""
+    return _utc(t.get('dateTime') or t.get('date'), t.get('timeZone') or tzname)
+
+def ics_utc(t, tzname=None):
+    """start/end события -> 20250101T120000Z."""
+    return when(t, tzname).strftime('%Y%m%dT%H%M%SZ')
+
+def to_ics(cal):
+    """Календарь fake в ICS (DTSTART/DTEND в UTC, UID = id события)."""
+    out = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//GeoDAC//push_gcal local//EN',
+           f"X-WR-CALNAME:{ics_escape(cal['summary'])}"]
+    if cal.get('timeZone'): out.append(f"X-WR-TIMEZONE:{cal['timeZone']}")
+    tz = cal.get('timeZone')
+    for e in sorted(cal['events'].values(), key=lambda e: when(e['start'], tz)):
+        out += ['BEGIN:VEVENT', f"UID:{e['id']}@geodac.local",
+                f"DTSTART:{ics_utc(e['start'], tz)}", f"DTEND:{ics_utc(e['end'], tz)}",
+                f"SUMMARY:{ics_escape(e.get('summary', ''))}"]
+        if e.get('description'): out.append(f"DESCRIPTION:{ics_escape(e['description'])}")
+        for a in (e.get('reminders') or {}).get('overrides', []):
+            out += ['BEGIN:VALARM', 'ACTION:DISPLAY', f"TRIGGER:-PT{a['minutes']}M", 'END:VALARM']
+        out.append('END:VEVENT')
+    out.append('END:VCALENDAR')
+    return '\r\n'.join(out) + '\r\n'
+
+class LocalCalendar(FakeCalendar):
+    """fake с состоянием в каталоге: <id>.json (события, seq, версии) и <id>.ics для
+    просмотра/импорта. Пишется в flush() (и при выходе), не на каждый запрос."""
+    def __init__(self, root, **kw):
+        super().__init__(**kw)
+        self.root = os.path.expanduser(root); os.makedirs(self.root, exist_ok=True)
+        self.dirty = set()
+        self.mirror_root = os.path.join(self.root, '.mirror')
+        self.backup_root = os.path.join(self.root, '.backups')
+        for fn in sorted(os.listdir(self.root)):
+            if not fn.endswith('.json'): continue
+            d = json.load(open(os.path.join(self.root, fn), encoding='utf-8'))
+            cid = fn[:-5]
+            self.cals[cid] = {'summary': d['summary'], 'timeZone': d.get('timeZone'), 'events': d['events']}
+            self.seq = max(self.seq, d.get('seq', 0)); self.ver = max(self.ver, d.get('ver', 0))
+            self.changed.update({(cid, i): v for i, v in d.get('changed', {}).items()})
+        import atexit; atexit.register(self.flush)
+
+    def _dirty(self, cal_id): self.dirty.add(cal_id)
+
+    def flush(self):
+        with self.lock:
+            for cid in sorted(self.dirty):
+                cal = self.cals[cid]
+                d = {'summary': cal['summary'], 'timeZone': cal.get('timeZone'), 'seq': self.seq, 'ver': self.ver,
+                     'changed': {i: v for (c, i), v in self.changed.items() if c == cid}, 'events': cal['events']}
+                p = os.path.join(self.root, cid + '.json')
+                with open(p + '.tmp', 'w', encoding='utf-8') as f: json.dump(d, f, ensure_ascii=False)
+                os.replace(p + '.tmp', p)
+                with open(os.path.join(self.root, cid + '.ics'), 'w', encoding='utf-8', newline='') as f:
+                    f.write(to_ics(cal))
+                print(f"[local] {cal['summary']}: {len(cal['events'])} events -> {p}", file=sys.stderr)
+            self.dirty.clear()
+
+    def insert(self, calendarId=None, body=None, **kw):
+        if calendarId is None:   # id каталога стабилен между запусками
+            def run():
+                cid = 'cal_' + hashlib.sha1(body['summary'].encode('utf-8')).hexdigest()[:12]
+                self.cals.setdefault(cid, {'summary': body['summary'], 'timeZone': body.get('timeZone'), 'events': {}})
+                self._dirty(cid)
+                return {'id': cid}
+            return _Req(self, run)
+        return super().insert(calendarId, body, **kw)
+
+def parse_opts(s):
+    """'latency=0.05,errors=0.01,status=429/503' -> kwargs FakeCalendar."""
+    kw = {}
+    for part in filter(None, (s or '').split(',')):
+        k, _, v = part.partition('=')
+        if k == 'status': kw[k] = tuple(int(x) for x in v.split('/'))
+        elif k in ('seed', 'page'): kw[k] = int(v)
+        elif k in ('latency', 'errors', 'batch_errors'): kw[k] = float(v)
+        else: raise ValueError(f"unknown backend option: {k}")
+    return kw
+
+def open_backend(spec):
+    """fake[:opts] | local:DIR[,opts] -> сервис. google — в push_gcal.open_backend."""
+    kind, _, rest = spec.partition(':')
+    if kind == 'fake':
+        return FakeCalendar(**parse_opts(rest))
+    if kind == 'local':
+        root, _, opts = rest.partition(',')
+        if not root: raise ValueError("local backend needs a directory: local:DIR")
+        return LocalCalendar(root, **parse_opts(opts))
+    raise ValueError(f"unknown backend: {spec}")
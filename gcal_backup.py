@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Инкрементальные бэкапы управляемых календарей из листинга push_gcal.
+#
+# Хранилище ~/astro/backups/gcal/<sha(calendar)>/:
+#   objects/ab/<key>.json.gz   — тело события: key = 'e' + sha1(id|etag) — etag меняет
+#                                любая правка, и из UI (gd_hash при ней остаётся прежним)
+#   snapshots/<время>.json.gz  — снимок: parent + только изменённые с него id -> key
+#                                (set) и удалённые id (drop); раз в REBASE — полный
+# Снимок делается в push_events по записям календаря, которые push и так получил
+# (зеркало/листинг) — до записи. С бэкапом этот листинг/sync идёт с полями тела (FIELDS)
+# и тела кладутся в objects на лету; чего не хватило (первый бэкап при готовом
+# зеркале) — добирается одним постраничным events.list, не events.get на событие.
+# Ответы на записи push кладутся в objects сразу — следующий снимок их не тянет.
+#
+#   gcal_backup.py list    --calendar NAME
+#   gcal_backup.py restore [SNAPSHOT] --calendar NAME [--into NAME2] [--plan]
+import os, sys, json, gzip, hashlib, argparse
+from datetime import datetime
+
+ROOT = os.path.expanduser('~/astro/backups/gcal')
+REBASE = 30   # полный снимок после стольких дельт подряд (длина цепочки при restore)
+BODY_KEYS = ('summary', 'description', 'location', 'colorId', 'start', 'end', 'visibility', 'transparency',
+             'extendedProperties', 'reminders')
+FIELDS = 'items(id,status,etag,' + ','.join(BODY_KEYS) + '),nextPageToken,nextSyncToken'
+
+def normalize(ev):
+    """Событие API -> тело для insert (без id/etag/created/htmlLink...)."""
+    return {k: ev[k] for k in BODY_KEYS if k in ev}
+
+def _dump_gz(path, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, 'wb') as f: f.write(gzip.compress(data, mtime=0))
+    os.replace(tmp, path)
+
+def _load_gz(path):
+    with open(path, 'rb') as f: return json.loads(gzip.decompress(f.read()))
+
+class Store:
+    FIELDS = FIELDS   # поля листинга push_gcal при бэкапе
+
+    def __init__(self, calendar, root=None):
+        self.calendar = calendar
+        self.dir = os.path.join(root or ROOT, hashlib.sha1(calendar.encode('utf-8')).hexdigest()[:16])
+        self.written = 0
+
+    def _obj(self, key): return os.path.join(self.dir, 'objects', key[:2], key + '.json.gz')
+    def has(self, key): return os.path.exists(self._obj(key))
+    def get(self, key): return _load_gz(self._obj(key))
+
+    def put(self, key, body):
+        if self.has(key): return
+        _dump_gz(self._obj(key), normalize(body)); self.written += 1
+
+    def seen(self, it):
+        """Событие из листинга/ответа API (с id и etag) — в objects."""
+        if it.get('id') and it.get('etag') and it.get('status') != 'cancelled':
+            self.put(self.key_of(it['id'], it), it)
+
+    stored = seen   # ответ на запись push
+
+    @staticmethod
+    def key_of(event_id, rec):
+        return 'e' + hashlib.sha1(f"{event_id}|{rec.get('etag')}".encode()).hexdigest()[:16]
+
+    def snapshots(self):
+        d = os.path.join(self.dir, 'snapshots')
+        return sorted(f[:-8] for f in os.listdir(d) if f.endswith('.json.gz')) if os.path.isdir(d) else []
+
+    def manifest(self, name):
+        return _load_gz(os.path.join(self.dir, 'snapshots', name + '.json.gz'))
+
+    def state(self, name=None):
+        """Полное состояние снимка (последнего, если name=None): id события -> key."""
+        chain = []
+        name = name or (self.snapshots() or [None])[-1]
+        while name:
+            m = self.manifest(name); chain.append(m); name = m.get('parent')
+        st = {}
+        for m in reversed(chain):
+            for i in m.get('drop', []): st.pop(i, None)
+            st.update(m.get('set', {}))
+        return st
+
+    def snapshot(self, service, cal_id, recs):
+        """Снимок по записям календаря (id -> запись push_gcal); недостающие тела — одним
+        постраничным листингом. -> имя снимка или None (без изменений с прошлого)."""
+        cur = {i: self.key_of(i, r) for i, r in recs.items()}
+        missing = {i: k for i, k in cur.items() if not self.has(k)}; lost = []
+        if missing:
+            pageToken = None
+            while True:
+                resp = service.events().list(calendarId=cal_id, maxResults=2500, singleEvents=True, showDeleted=False,
+                                             pageToken=pageToken, fields=FIELDS).execute()
+                for it in resp.get('items', []):
+                    if it.get('id') in missing: self.seen(it)
+                pageToken = resp.get('nextPageToken')
+                if not pageToken: break
+            lost = [i for i, k in missing.items() if not self.has(k)]
+            for i in lost: cur.pop(i)   # изменилось между листингами — в снимок не попадает
+            if lost: print(f"[backup] WARN: {len(lost)} events changed while listing, not in snapshot", file=sys.stderr)
+        names = self.snapshots()
+        parent = names[-1] if names else None
+        prev = self.state(parent) if parent else {}
+        depth = self.manifest(parent).get('depth', 0) + 1 if parent else 0
+        if parent and prev == cur:
+            print(f"[backup] unchanged since {parent} ({len(cur)} events)"); return None
+        name = datetime.now().strftime('%Y%m%d-%H%M%S')
+        if name in names: name += f"-{len(names)}"
+        if parent is None or depth >= REBASE:
+            m = {'parent': None, 'depth': 0, 'set': cur, 'drop': []}
+        else:
+            m = {'parent': parent, 'depth': depth, 'set': {i: k for i, k in cur.items() if prev.get(i) != k},
+                 'drop': sorted(set(prev) - set(cur))}
+        m.update(calendar=self.calendar, cal_id=cal_id, time=datetime.now().isoformat(timespec='seconds'),
+                 count=len(cur))
+        _dump_gz(os.path.join(self.dir, 'snapshots', name + '.json.gz'), m)
+        print(f"[backup] {name}: {len(cur)} events, changed={len(m['set'])} dropped={len(m['drop'])} "
+              f"fetched={len(missing) - len(lost)}")
+        return name
+
+def cmd_list(args):
+    import push_gcal
+    st = push_gcal.backend_backup(push_gcal.open_backend(args.backend, args.creds), args.calendar)
+    if st is None: print(f"backend {args.backend} keeps no backups"); return 1
+    names = st.snapshots()
+    if not names: print(f"no snapshots for '{args.calendar}' in {st.dir}"); return 1
+    for n in names:
+        m = st.manifest(n)
+        kind = 'full' if m.get('parent') is None else f"delta +{len(m['set'])} -{len(m['drop'])}"
+        print(f"{n}  events={m.get('count')}  {kind}")
+    size = sum(os.path.getsize(os.path.join(dp, f)) for dp, _, fs in os.walk(st.dir) for f in fs)
+    print(f"{len(names)} snapshots, {size/1024:.0f} KiB in {st.dir}")
+    return 0
+
+def cmd_restore(args):
+    import push_gcal
+    service = push_gcal.open_backend(args.backend, args.creds)
+    st = push_gcal.backend_backup(service, args.calendar)
+    if st is None: print(f"backend {args.backend} keeps no backups", file=sys.stderr); return 2
+    name = args.snapshot or (st.snapshots() or [None])[-1]
+    if not name: print(f"no snapshots for '{args.calendar}'", file=sys.stderr); return 2
+    desired = {}; skipped = 0
+    for i, key in st.state(name).items():
+        body = st.get(key)
+        priv = (body.get('extendedProperties') or {}).get('private') or {}
+        gd = priv.get('gd_id')
+        if not gd: skipped += 1; continue   # без gd_id push не сопоставит — не восстанавливаем
+        # объекты событий, записанных до gd_hash (скачаны events.get), — хэш считаем здесь:
+        # plan_ops/журнал работают только с хэшированными телами
+        if not priv.get('gd_hash'): priv['gd_hash'] = push_gcal.content_hash(body)
+        desired[gd] = body
+    into = args.into or args.calendar
+    print(f"[restore] {name}: {len(desired)} events -> '{into}'" + (f" (skipped {skipped} without gd_id)" if skipped else ""))
+    if args.plan:
+        m = push_gcal.backend_mirror(service, into)
+        if m is None or m.cal_id is None:
+            print(f"[plan] no mirror for '{into}' yet", file=sys.stderr); return 2
+        ops = push_gcal.plan_ops(desired, m.recs, replace=True, tzname=args.tz)
+        print(f"[plan] insert={len(ops['insert'])} update={len(ops['update'])} unchanged={ops['unchanged']} "
+              f"delete={len(ops['delete'])}")
+        return 0
+    cal_id = push_gcal.get_or_create_calendar(service, into, args.tz)
+    sender = push_gcal.Sender(service, workers=args.workers, rate=push_gcal.RATE if args.rate is None else args.rate)
+    # перед restore — снимок текущего состояния: restore тоже откатывается
+    res = push_gcal.push_bodies(service, cal_id, desired, args.tz, replace=True, sender=sender,
+                                mirror=push_gcal.backend_mirror(service, into),
+                                backup=push_gcal.backend_backup(service, into))
+    sender.report()
+    if hasattr(service, 'flush'): service.flush()
+    return 1 if res['failed'] else 0
+
+def main():
+    ap = argparse.ArgumentParser(description="Incremental backups of managed Google calendars")
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('list', help='List snapshots')
+    p.add_argument('--calendar', required=True)
+    p.add_argument('--creds', default=os.path.expanduser('~/astro/.gcal'))
+    p.add_argument('--backend', default=os.environ.get('GEODAC_GCAL_BACKEND', 'google'))
+    p.set_defaults(fn=cmd_list)
+    p = sub.add_parser('restore', help='Make the calendar match a snapshot (default: latest)')
+    p.add_argument('snapshot', nargs='?')
+    p.add_argument('--calendar', required=True, help='Calendar whose backups to use')
+    p.add_argument('--into', help='Restore into another calendar (default: the same)')
+    p.add_argument('--tz', default=os.environ.get('TZ', 'Europe/Moscow'))
+    p.add_argument('--creds', default=os.path.expanduser('~/astro/.gcal'))
+    p.add_argument('--backend', default=os.environ.get('GEODAC_GCAL_BACKEND', 'google'))
+    p.add_argument('--workers', type=int, default=1)
+    p.add_argument('--rate', type=float, default=None, help='Requests/second (default push_gcal.RATE)')
+    p.add_argument('--plan', action='store_true', help='Offline: show what restore would change (from the mirror)')
+    p.set_defaults(fn=cmd_restore)
+    args = ap.parse_args()
+    return args.fn(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
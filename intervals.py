@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Кластеризация интервалов для склейки осей (render_for_ics.axis_unify_events,
+# lunar_merge_angles.merge_axes_events): одна сортировка по (группа, начало) и
+# один проход — O(n log n), время — числа (секунды), разобранные вызывающим один раз.
+#
+# Правило склейки общее для обоих модулей: соседние по началу интервалы одной группы
+# в одном кластере, если max(a0, b0) <= min(a1, b1) + pad (сравнение с предыдущим
+# интервалом, не с концом всего кластера); без начала — всегда отдельный кластер.
+from datetime import datetime, timezone
+
+PAD_S = 6 * 3600   # подушка склейки осей, 6 ч
+
+_TZ = {}
+def zone(tzname):
+    """ZoneInfo по имени, один раз на процесс (None — без zoneinfo)."""
+    if tzname not in _TZ:
+        try:
+            from zoneinfo import ZoneInfo
+            _TZ[tzname] = ZoneInfo(tzname)
+        except Exception:
+            _TZ[tzname] = None
+    return _TZ[tzname]
+
+def clusters(items, group, t0, t1=None, pad=PAD_S):
+    """items — любые объекты; group(x) -> ключ группы (None — пропустить);
+    t0(x)/t1(x) -> число или None (конец None -> начало).
+    -> [(ключ, [items])]: группы в порядке первого появления, внутри — кластеры по времени
+    (равные начала — в исходном порядке)."""
+    rank = {}; recs = []
+    for seq, x in enumerate(items):
+        g = group(x)
+        if g is None: continue
+        a = t0(x); b = t1(x) if t1 else None
+        if b is None: b = a
+        recs.append((rank.setdefault(g, len(rank)), a is None, a if a is not None else 0.0, seq, g, a, b, x))
+    recs.sort(key=lambda r: r[:4])
+    out = []; prev = None
+    for r, _none, _k, _seq, g, a, b, x in recs:
+        if prev is not None and prev[0] == r and a is not None and prev[1] is not None \
+                and max(prev[1], a) <= min(prev[2], b) + pad:
+            out[-1][1].append(x)
+        else:
+            out.append((g, [x]))
+        prev = (r, a, b)
+    return out
+
+def epoch(d):
+    """datetime -> секунды (None -> None)."""
+    return d.timestamp() if d is not None else None
+
+def parse_utc(x, tzname=None):
+    """ISO-строка/{'dateTime'|'date'} -> aware UTC datetime; наивное время — в tzname
+    (или UTC); неразборчивое -> None."""
+    if x is None: return None
+    if isinstance(x, dict): x = x.get('dateTime') or x.get('date') or x
+    s = str(x).strip()
+    if not s: return None
+    s = s.replace('Z', '+00:00')
+    for cand in (s, s.replace(' ', 'T')):
+        try:
+            d = datetime.fromisoformat(cand)
+        except ValueError:
+            continue
+        if d.tzinfo is None:
+            d = d.replace(tzinfo=(zone(tzname) if tzname else None) or timezone.utc)
+        return d.astimezone(timezone.utc)
+    return None
@@ -87,15 +87,21 @@ def fix_houses_line_force(line: str, hmoon: int, axis: str) -> str:
         return f"Дома: ☽=H{hmoon}; Ось={axis}"
     return line
 
+_PC = None   # ephem_cache.PositionCache после первого расчёта
+
 def moon_lon_jd(jd):
-    import swisseph as swe
+    import swisseph as swe, ephem_cache
     # Эфемериды: ZET Swiss, если есть; иначе локальная папка
+    ephe = None
     for cand in ('/home/DAC/Zet9 GeoDAC/Swiss', os.path.expanduser('~/astro/ephe')):
         if os.path.exists(cand):
             swe.set_ephe_path(cand)
+            ephe = cand
             break
-    pos, _ = swe.calc_ut(jd, swe.MOON, swe.FLG_SWIEPH)
-    return norm(pos[0])
+    # одинаковые пики/середины окон в обоих файлах — из LRU-кэша
+    global _PC
+    _PC = ephem_cache.open_cache(ephe, swe.FLG_SWIEPH)
+    return norm(_PC.lon(jd, swe.MOON))
 
 def jd_from_dt(dt):
     import swisseph as swe
@@ -111,7 +117,16 @@ def middle_dt(start, end):
 
 def process_file(path, C):
     data = json.load(open(path, encoding='utf-8'))
-    evs = data.get('events', data)
+    changed = rehouse_events(data.get('events', data), C)
+    if changed:
+        json.dump(data, open(path,'w',encoding='utf-8'), ensure_ascii=False, indent=2)
+        print(f"[rehouse+] {os.path.basename(path)} changed={changed}")
+    else:
+        print(f"[ok] {os.path.basename(path)} no changes")
+    return changed
+
+def rehouse_events(evs, C):
+    """Правит осевые события списка на месте; возвращает число изменений."""
     changed = 0
     for e in evs:
         ssum = e.get('summary') or ''
@@ -160,12 +175,6 @@ def process_file(path, C):
         if (e.get('peak') or '') != new_peak:
             e['peak'] = new_peak
             changed += 1
-
-    if changed:
-        json.dump(data, open(path,'w',encoding='utf-8'), ensure_ascii=False, indent=2)
-        print(f"[rehouse+] {os.path.basename(path)} changed={changed}")
-    else:
-        print(f"[ok] {os.path.basename(path)} no changes")
     return changed
 
 def main():
@@ -178,6 +187,8 @@ def main():
         else:
             print(f"[skip] {p} missing")
     print(f"[total changes] {total}")
+    if _PC is not None:
+        print(_PC.summary())
 
 if __name__ == '__main__':
     main()
@@ -1,5 +1,6 @@
 import json, os, re, sys
-from datetime import datetime, timezone, timedelta
+import intervals
+from datetime import datetime, timezone
 
 # — helpers —
 def parse_iso(s):
@@ -54,149 +55,123 @@ def glyph(x): return x  # глифы оставляем как есть (они
 # — core —
 def merge_axes(input_path, output_path):
     raw = json.load(open(input_path, encoding='utf-8'))
-    events = raw.get('events', raw)
+    merged = merge_axes_events(raw.get('events', raw))
+    json.dump({"events": merged}, open(output_path, 'w', encoding='utf-8'), ensure_ascii=False, indent=2)
+    print(f"[merge-axes] {os.path.basename(input_path)} -> {os.path.basename(output_path)}; events={len(merged)}")
 
-    # Группируем осевые по (axis, transit), остальные — как есть
+def merge_axes_events(events):
+    """Склейка осевых пар в списке событий (в памяти); неосевые — как есть."""
+    # Осевые: время разбираем один раз; кластеры по (axis, transit) с подушкой 6ч —
+    # intervals.clusters (одна сортировка + проход); остальные — как есть
     idx_rest = []
-    groups = {}
+    items = []
     for i, e in enumerate(events):
         tg = (e.get('target') or '').upper()
         ax = axis_of_target(tg)
         if not ax:
             idx_rest.append(i)
             continue
-        tr = (e.get('transit') or '').upper()
-        groups.setdefault((ax, tr), []).append(i)
-
-    # Кластеризация по пересечению интервалов (с подушкой 6ч)
-    def pdt(e):
-        return parse_iso(e.get('start') or e.get('peak') or '')
-    def pend(e):
-        return parse_iso(e.get('end') or e.get('peak') or '')
-    def overlap(a0,a1,b0,b1, pad=timedelta(hours=6)):
-        if not a0 or not b0: return False
-        A0, A1 = (a0, a1 or a0)
-        B0, B1 = (b0, b1 or b0)
-        return max(A0,B0) <= (min(A1,B1) + pad)
+        asp_raw = e.get('aspect') or ''
+        asp_g = asp_raw if asp_raw in ('☌','☍','□','△','✶') else (e.get('aspect') or '')
+        t0 = parse_iso(e.get('start') or e.get('peak') or '')
+        t1 = parse_iso(e.get('end') or e.get('peak') or '')
+        items.append({'i': i, 'asp': asp_g, 'tg': tg, 't0': t0, 't1': t1, 'e': e,
+                      'g': (ax, (e.get('transit') or '').upper()),
+                      's0': intervals.epoch(t0), 's1': intervals.epoch(t1)})
 
     merged = []
 
-    for (axis, tr), idxs in groups.items():
-        items = []
-        for i in idxs:
-            e = events[i]
-            asp_raw = e.get('aspect') or ''
-            asp_g = asp_raw if asp_raw in ('☌','☍','□','△','✶') else (e.get('aspect') or '')
-            items.append({
-                'i': i,
-                'asp': asp_g,
-                'tg': (e.get('target') or '').upper(),
-                't0': pdt(e),
-                't1': pend(e),
-                'e':  e,
-            })
-        items.sort(key=lambda x: x['t0'] or datetime.max.replace(tzinfo=timezone.utc))
-        # кластеризуем
-        clusters, cur = [], []
-        for it in items:
-            if not cur:
-                cur = [it]; continue
-            a0,a1 = cur[-1]['t0'], (cur[-1]['t1'] or cur[-1]['t0'])
-            b0,b1 = it['t0'],     (it['t1'] or it['t0'])
-            if overlap(a0,a1,b0,b1): cur.append(it)
-            else: clusters.append(cur); cur=[it]
-        if cur: clusters.append(cur)
-
+    for (axis, tr), cl in intervals.clusters(items, lambda x: x['g'], lambda x: x['s0'], lambda x: x['s1'],
+                                             pad=intervals.PAD_S):
         # соберём осмысленные пары: должны присутствовать обе точки оси
-        for cl in clusters:
-            tgts = {x['tg'] for x in cl}
-            if axis=='HOR' and not ('ASC' in tgts and ('DSC' in tgts or 'DESC' in tgts)): continue
-            if axis=='VERT' and not ('MC' in tgts and 'IC' in tgts): continue
-
-            # окно и середина
-            c_t0 = min(x['t0'] for x in cl if x['t0'])
-            c_t1 = max((x['t1'] or x['t0']) for x in cl if (x['t1'] or x['t0']))
-            peak_dt = c_t0 + (c_t1 - c_t0)/2 if (c_t0 and c_t1) else (c_t0 or c_t1)
-
-            # итоговый аспект: если один — берём его, если два — «☍/☌» или что ближе по порядку
-            order = {'□':0,'☍':1,'△':2,'✶':3,'☌':4}
-            asp_set = sorted({x['asp'] for x in cl}, key=lambda z: order.get(z,9))
-            asp_str = asp_set[0] if len(asp_set)==1 else '/'.join(asp_set)
-
-            # базовое событие (для описания)
-            base = sorted(cl, key=lambda x: (order.get(x['asp'],9), x['t0'] or datetime.max.replace(tzinfo=timezone.utc)))[0]['e']
-            base_desc = (base.get('description') or '').strip()
-
-            # заголовок склейки
-            hdr = ["Склейка по " + axis_label(axis) + ":"] + [
-                f"• {x['asp']} {x['tg']}: {x['t0'].isoformat().replace('+00:00','Z')} → {(x['t1'] or x['t0']).isoformat().replace('+00:00','Z')}"
-                for x in cl
-            ]
-
-            # знаки: берём по целям и транзиту
-            def glyph_sign(v):
-                g = str(v or '').upper()
-                table = {'ARIES':'♈','TAURUS':'♉','GEMINI':'♊','CANCER':'♋','LEO':'♌','VIRGO':'♍','LIBRA':'♎',
-                         'SCORPIO':'♏','SAGITTARIUS':'♐','CAPRICORN':'♑','AQUARIUS':'♒','PISCES':'♓'}
-                return table.get(g, v or '')
-            tr_sign = None
-            asc_sign = None
-            dsc_sign = None
-            mc_sign  = None
-            ic_sign  = None
-            for x in cl:
-                sg = x['e'].get('signs') or {}
-                if sg.get('tr') and not tr_sign: tr_sign = glyph_sign(sg.get('tr'))
-                tgt = x['tg']
-                if axis=='HOR':
-                    if tgt=='ASC' and not asc_sign: asc_sign = glyph_sign(sg.get('nat'))
-                    if tgt in ('DSC','DESC') and not dsc_sign: dsc_sign = glyph_sign(sg.get('nat'))
-                else:
-                    if tgt=='MC' and not mc_sign: mc_sign = glyph_sign(sg.get('nat'))
-                    if tgt=='IC' and not ic_sign: ic_sign = glyph_sign(sg.get('nat'))
-
-            # описание: берём базовое и чистим
-            base_lines = [ln for ln in base_desc.splitlines() if not re.match(r'^\s*(Знаки|Дома|Совет)\s*:', ln)]
-            body = "\n".join([ln for ln in base_lines if ln.strip()])
-            body = sanitize_desc(body)
-
-            parts = ["\n".join(hdr)]
-            if body: parts += ["", body]
-
-            # Контекст: знаки/дома в явном формате
-            if axis=='HOR':
-                z = []
-                if tr_sign:  z.append(f"☽={tr_sign}")
-                if asc_sign: z.append(f"ASC={asc_sign}")
-                if dsc_sign: z.append(f"DSC={dsc_sign}")
-                if z: parts.append("Знаки: " + "; ".join(z))
-                parts.append("Дома: Ось=H1/H7")
-            else:
-                z = []
-                if tr_sign: z.append(f"☽={tr_sign}")
-                if mc_sign: z.append(f"MC={mc_sign}")
-                if ic_sign: z.append(f"IC={ic_sign}")
-                if z: parts.append("Знаки: " + "; ".join(z))
-                parts.append("Дома: Ось=H10/H4")
-
-            desc = "\n".join(parts).strip()
-
-            # Итоговый summary: без скобок «(из H…/Луна в H…)»
-            sum_base = strip_last_bracket(base.get('summary') or '')
-            # Пересобираем лаконично: оставляем только «к горизонтали/вертикали»
+        tgts = {x['tg'] for x in cl}
+        if axis=='HOR' and not ('ASC' in tgts and ('DSC' in tgts or 'DESC' in tgts)): continue
+        if axis=='VERT' and not ('MC' in tgts and 'IC' in tgts): continue
+
+        # окно и середина
+        c_t0 = min(x['t0'] for x in cl if x['t0'])
+        c_t1 = max((x['t1'] or x['t0']) for x in cl if (x['t1'] or x['t0']))
+        peak_dt = c_t0 + (c_t1 - c_t0)/2 if (c_t0 and c_t1) else (c_t0 or c_t1)
+
+        # итоговый аспект: если один — берём его, если два — «☍/☌» или что ближе по порядку
+        order = {'□':0,'☍':1,'△':2,'✶':3,'☌':4}
+        asp_set = sorted({x['asp'] for x in cl}, key=lambda z: order.get(z,9))
+        asp_str = asp_set[0] if len(asp_set)==1 else '/'.join(asp_set)
+
+        # базовое событие (для описания)
+        base = sorted(cl, key=lambda x: (order.get(x['asp'],9), x['t0'] or datetime.max.replace(tzinfo=timezone.utc)))[0]['e']
+        base_desc = (base.get('description') or '').strip()
+
+        # заголовок склейки
+        hdr = ["Склейка по " + axis_label(axis) + ":"] + [
+            f"• {x['asp']} {x['tg']}: {x['t0'].isoformat().replace('+00:00','Z')} → {(x['t1'] or x['t0']).isoformat().replace('+00:00','Z')}"
+            for x in cl
+        ]
+
+        # знаки: берём по целям и транзиту
+        def glyph_sign(v):
+            g = str(v or '').upper()
+            table = {'ARIES':'♈','TAURUS':'♉','GEMINI':'♊','CANCER':'♋','LEO':'♌','VIRGO':'♍','LIBRA':'♎',
+                     'SCORPIO':'♏','SAGITTARIUS':'♐','CAPRICORN':'♑','AQUARIUS':'♒','PISCES':'♓'}
+            return table.get(g, v or '')
+        tr_sign = None
+        asc_sign = None
+        dsc_sign = None
+        mc_sign  = None
+        ic_sign  = None
+        for x in cl:
+            sg = x['e'].get('signs') or {}
+            if sg.get('tr') and not tr_sign: tr_sign = glyph_sign(sg.get('tr'))
+            tgt = x['tg']
             if axis=='HOR':
-                summary = f"☽ {asp_str} к горизонтали (ASC/DSC)"
+                if tgt=='ASC' and not asc_sign: asc_sign = glyph_sign(sg.get('nat'))
+                if tgt in ('DSC','DESC') and not dsc_sign: dsc_sign = glyph_sign(sg.get('nat'))
             else:
-                summary = f"☽ {asp_str} к вертикали (MC/IC)"
-
-            merged.append({
-                "summary": summary,
-                "start": iso_z(c_t0) if c_t0 else None,
-                "end":   iso_z(c_t1) if c_t1 else None,
-                "peak":  iso_z(peak_dt) if peak_dt else (base.get('peak') or base.get('start') or ''),
-                "description": desc,
-                # houses: ось — не числовой дом; поле опускаем, чтобы не путать
-            })
+                if tgt=='MC' and not mc_sign: mc_sign = glyph_sign(sg.get('nat'))
+                if tgt=='IC' and not ic_sign: ic_sign = glyph_sign(sg.get('nat'))
+
+        # описание: берём базовое и чистим
+        base_lines = [ln for ln in base_desc.splitlines() if not re.match(r'^\s*(Знаки|Дома|Совет)\s*:', ln)]
+        body = "\n".join([ln for ln in base_lines if ln.strip()])
+        body = sanitize_desc(body)
+
+        parts = ["\n".join(hdr)]
+        if body: parts += ["", body]
+
+        # Контекст: знаки/дома в явном формате
+        if axis=='HOR':
+            z = []
+            if tr_sign:  z.append(f"☽={tr_sign}")
+            if asc_sign: z.append(f"ASC={asc_sign}")
+            if dsc_sign: z.append(f"DSC={dsc_sign}")
+            if z: parts.append("Знаки: " + "; ".join(z))
+            parts.append("Дома: Ось=H1/H7")
+        else:
+            z = []
+            if tr_sign: z.append(f"☽={tr_sign}")
+            if mc_sign: z.append(f"MC={mc_sign}")
+            if ic_sign: z.append(f"IC={ic_sign}")
+            if z: parts.append("Знаки: " + "; ".join(z))
+            parts.append("Дома: Ось=H10/H4")
+
+        desc = "\n".join(parts).strip()
+
+        # Итоговый summary: без скобок «(из H…/Луна в H…)»
+        sum_base = strip_last_bracket(base.get('summary') or '')
+        # Пересобираем лаконично: оставляем только «к горизонтали/вертикали»
+        if axis=='HOR':
+            summary = f"☽ {asp_str} к горизонтали (ASC/DSC)"
+        else:
+            summary = f"☽ {asp_str} к вертикали (MC/IC)"
+
+        merged.append({
+            "summary": summary,
+            "start": iso_z(c_t0) if c_t0 else None,
+            "end":   iso_z(c_t1) if c_t1 else None,
+            "peak":  iso_z(peak_dt) if peak_dt else (base.get('peak') or base.get('start') or ''),
+            "description": desc,
+            # houses: ось — не числовой дом; поле опускаем, чтобы не путать
+        })
 
     # Все неосевые — как есть
     for i in idx_rest:
@@ -206,9 +181,7 @@ def merge_axes(input_path, output_path):
     def ev_t(e):
         return parse_iso(e.get('peak') or e.get('start') or '') or datetime.max.replace(tzinfo=timezone.utc)
     merged.sort(key=ev_t)
-
-    json.dump({"events": merged}, open(output_path, 'w', encoding='utf-8'), ensure_ascii=False, indent=2)
-    print(f"[merge-axes] {os.path.basename(input_path)} -> {os.path.basename(output_path)}; events={len(merged)}")
+    return merged
 
 def main():
     if len(sys.argv) < 3:
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Лунный пайплайн одним процессом: compute → render → merge → (rehouse) → guard → backup+push.
+#
+# Заменяет цепочку интерпретаторов из push_lunar_natal_managed.sh: события идут между
+# стадиями в памяти, swisseph/googleapiclient импортируются один раз. На диск — те же
+# файлы, что писал shell (--raw, --for-ics, --merged: их читают rehouse, mk_lunar_ics*,
+# lunar_refine_peaks, diagnose) и, с --snapshots, срезы стадий.
+import os, sys, json, time, fcntl, argparse
+import datetime as dt
+
+ASTRO = os.path.expanduser('~/astro')
+STATE = os.path.join(ASTRO, '.state')
+LOCK = '/tmp/geodac_lunar.lock'
+CAL = "Astro — Lunar Natal (Managed)"
+EPHE = "/home/DAC/Zet9 GeoDAC/Swiss"
+BODIES = ['Moon', 'NNode']
+
+def acquire_lock(path):
+    """flock -n: дескриптор держим до конца процесса; None — уже занято."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+def write_json(path, obj):
+    path = os.path.expanduser(path)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def snapshot(dirpath, name, events):
+    if not dirpath: return
+    if os.path.basename(name) != name or name in ('', '.', '..'):
+        raise ValueError(f"bad snapshot name: {name!r}")   # срез — только внутри dirpath
+    os.makedirs(dirpath, exist_ok=True)
+    p = os.path.join(dirpath, f"{name}.json")
+    with open(p, 'w', encoding='utf-8') as f:
+        json.dump({'events': events}, f, ensure_ascii=False, indent=2)
+    print(f"[snapshot] {name}: {len(events)} -> {p}")
+
+class Stages:
+    """Замер стадий: with st('render'): ... -> строка [stage] в лог."""
+    def __init__(self): self.times = {}
+    def __call__(self, name):
+        self.name = name
+        return self
+    def __enter__(self):
+        self.t = time.perf_counter()
+    def __exit__(self, *exc):
+        self.times[self.name] = time.perf_counter() - self.t
+        print(f"[stage] {self.name} {self.times[self.name]:.2f}s", flush=True)
+
+def main():
+    today = dt.date.today()
+    ap = argparse.ArgumentParser(description="Lunar natal pipeline (compute → render → merge → push) in one process")
+    ap.add_argument('--from', dest='start', default=(today - dt.timedelta(days=14)).isoformat(),
+                    help='Start date YYYY-MM-DD (local TZ), default today-14d')
+    ap.add_argument('--to', dest='end', default=(today + dt.timedelta(days=14)).isoformat(),
+                    help='End date YYYY-MM-DD (local TZ), default today+14d')
+    ap.add_argument('--ephe', default=EPHE, help='Path to Swiss ephemeris')
+    ap.add_argument('--bodies', default=','.join(BODIES))
+    ap.add_argument('--calendar', default=CAL)
+    ap.add_argument('--tz', default=os.environ.get('TZ', 'Europe/Moscow'))
+    ap.add_argument('--creds', default=os.path.join(ASTRO, '.gcal'))
+    ap.add_argument('--backend', default=os.environ.get('GEODAC_GCAL_BACKEND', 'google'),
+                    help='push_gcal backend: google | local:DIR | fake[:opts]')
+    ap.add_argument('--state', default=os.path.join(STATE, 'lunar_scan.ckpt.json'),
+                    help="Scan checkpoint for incremental runs ('' = full scan)")
+    ap.add_argument('--raw', default=os.path.join(ASTRO, 'lunar_natal.json'),
+                    help='Where to write the raw scan (transits_slow output)')
+    ap.add_argument('--for-ics', default=os.path.join(ASTRO, 'lunar_natal_for_ics.json'),
+                    help='Where to write the rendered events (read by rehouse, mk_lunar_ics*, lunar_refine_peaks)')
+    ap.add_argument('--merged', default=os.path.join(ASTRO, 'lunar_natal_merged.json'),
+                    help='Where to write the merged events (read by diagnose/rehouse)')
+    ap.add_argument('--merged-in', metavar='PATH',
+                    help='Push this prebuilt events JSON instead of the computed one (MERGED= in the shell wrapper)')
+    ap.add_argument('--min-events', type=int, default=int(os.environ.get('MIN_EVENTS', 10)),
+                    help='Abort (exit 3) if fewer rendered events than this')
+    ap.add_argument('--rehouse', action='store_true', help='Apply lunar_angles_rehouse fixes before push')
+    ap.add_argument('--snapshots', metavar='DIR', default=os.environ.get('GEODAC_SNAPSHOTS'),
+                    help='Dump raw/for_ics/merged stage outputs to DIR for debugging')
+    ap.add_argument('--workers', type=int, default=1, help='Concurrent push senders (push_gcal --workers)')
+    ap.add_argument('--rate', type=float, default=None, help='Push requests/second across workers (push_gcal --rate)')
+    ap.add_argument('--lock', default=LOCK)
+    ap.add_argument('--no-backup', action='store_true', help='Skip the pre-push snapshot (gcal_backup.py)')
+    ap.add_argument('--dry-run', action='store_true', help='Stop before Google Calendar (no backup, no push)')
+    args = ap.parse_args()
+
+    lock = acquire_lock(args.lock)
+    if lock is None:
+        print("[lunar] locked, skip"); return 0
+    os.makedirs(STATE, exist_ok=True)
+    print(f"[{dt.datetime.now():%F %T}] lunar start FROM={args.start} TO={args.end} CAL={args.calendar}", flush=True)
+    st = Stages()
+
+    service = cal_id = None
+    if not args.dry_run:
+        import push_gcal
+        with st('connect'):
+            service = push_gcal.open_backend(args.backend, args.creds)
+            cal_id = push_gcal.get_or_create_calendar(service, args.calendar, args.tz)
+
+    import transits_slow as ts, render_for_ics, lunar_merge_angles
+    names = [s.strip() for s in args.bodies.split(',') if s.strip()]
+    t0 = ts.TZ.localize(dt.datetime.fromisoformat(args.start + "T00:00"))
+    t1 = ts.TZ.localize(dt.datetime.fromisoformat(args.end + "T23:59"))
+    with st('compute'):
+        ts.EPHE = args.ephe
+        if args.state:
+            raw = ts.compute_incremental(t0, t1, names, os.path.expanduser(args.state))
+        else:
+            raw = ts.compute(t0, t1, names)
+    write_json(args.raw, raw)
+    print(f"[calc] events: {len(raw['events'])} -> {args.raw}")
+    snapshot(args.snapshots, 'raw', raw['events'])
+
+    with st('render'):
+        fix = render_for_ics.render_events(raw['events'])
+    write_json(args.for_ics, {'events': fix})   # до merge/rehouse: они правят события на месте
+    snapshot(args.snapshots, 'for_ics', fix)
+
+    with st('merge'):
+        merged = lunar_merge_angles.merge_axes_events(fix)
+    if args.rehouse:
+        import lunar_angles_rehouse as lar
+        with st('rehouse'):
+            print(f"[rehouse+] changed={lar.rehouse_events(merged, lar.load_cusps())}")
+    snapshot(args.snapshots, 'merged', merged)
+
+    # guard — как в shell: по числу отрендеренных событий
+    print(f"[validate] events: {len(fix)}")
+    if len(fix) < args.min_events:
+        print(f"[abort] too few events ({len(fix)} < {args.min_events})"); return 3
+    write_json(args.merged, {'events': merged})
+    print(f"[merge-axes] events={len(merged)} -> {args.merged}")
+    if args.merged_in:   # как прежний MERGED= в shell: считаем всё, а пушим готовый файл
+        merged = json.load(open(os.path.expanduser(args.merged_in), encoding='utf-8'))['events']
+        print(f"[push] using {args.merged_in}: events={len(merged)}")
+
+    if service is not None:
+        with st('push'):
+            sender = push_gcal.Sender(service, workers=args.workers,
+                                      rate=push_gcal.RATE if args.rate is None else args.rate)
+            res = push_gcal.push_events(service, cal_id, merged, args.tz, replace=True,
+                                        mirror=push_gcal.backend_mirror(service, args.calendar), sender=sender,
+                                        journal=push_gcal.backend_journal(service, args.calendar),
+                                        backup=None if args.no_backup else push_gcal.backend_backup(service, args.calendar))
+        sender.report(os.path.join(STATE, 'lunar_push_failures.json'))
+        if hasattr(service, 'flush'): service.flush()
+        if res['failed']:
+            print(f"[abort] push failed for {res['failed']} events"); return 1
+        with open(os.path.join(STATE, 'lunar.last_ok'), 'w') as f:
+            f.write(f"{int(time.time())}\n")
+    print(f"[{dt.datetime.now():%F %T}] lunar done ({sum(st.times.values()):.2f}s in stages)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, sys, json, argparse, hashlib, re
+import os, sys, json, argparse, hashlib, re, time, random, threading
 from datetime import datetime, timedelta, timezone
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -10,6 +10,13 @@ from google.auth.transport.requests import Request
 from dateutil import parser as duparser, tz as dutz
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
+BATCH_SIZE = 50   # запросов в одном batch (Calendar API: до 1000, рекомендовано ≤ 50)
+MIRROR_DIR = os.path.expanduser('~/astro/.state/gcal_mirror')
+# частичный ответ: только то, что нужно записи зеркала (record_of)
+LIST_FIELDS = 'items(id,status,etag,start,extendedProperties/private),nextPageToken,nextSyncToken'
+WINDOW_PAD = timedelta(days=1)   # запас окна листинга вокруг событий JSON
+RATE = 10.0      # запросов/с на все потоки (квота Calendar по умолчанию ~600/мин на пользователя)
+RETRIES = 5      # повторов временной ошибки (429/5xx/403 rateLimit), пауза 1,2,4… с ±50% джиттером
 
 def ensure_service(creds_dir):
     os.makedirs(creds_dir, exist_ok=True)
@@ -30,10 +37,18 @@ def ensure_service(creds_dir):
             f.write(creds.to_json())
     return build('calendar', 'v3', credentials=creds)
 
+def open_backend(spec, creds_dir):
+    """google — Calendar API; fake[:opts] / local:DIR — см. gcal_backends (офлайн)."""
+    if spec in ('', 'google'):
+        return ensure_service(creds_dir)
+    import gcal_backends
+    return gcal_backends.open_backend(spec)
+
 def get_or_create_calendar(service, summary, tzname):
     pageToken = None
     while True:
-        resp = service.calendarList().list(pageToken=pageToken, maxResults=250).execute()
+        resp = service.calendarList().list(pageToken=pageToken, maxResults=250,
+                                           fields='items(id,summary),nextPageToken').execute()
         for it in resp.get('items', []):
             if it.get('summary') == summary:
                 return it['id']
@@ -93,40 +108,403 @@ def build_event(e, tzname, eid=None):
     if eid: body['extendedProperties']['private']['gd_id'] = eid
     if alarm_min is not None:
         body['reminders']['overrides'] = [{'method':'popup','minutes': alarm_min}]
+    body['extendedProperties']['private']['gd_hash'] = content_hash(body)
     return body
 
-def existing_map(service, cal_id):
-    mp = {}; pageToken = None
+def content_hash(body):
+    """Канонический хэш тела события (без самого gd_hash): одинаковое тело — одинаковый хэш."""
+    b = json.loads(json.dumps(body))
+    b['extendedProperties']['private'].pop('gd_hash', None)
+    return hashlib.sha1(json.dumps(b, ensure_ascii=False, sort_keys=True, separators=(',',':')).encode('utf-8')).hexdigest()[:16]
+
+def record_of(it):
+    """Событие API -> запись зеркала (только управляемые geodac); None — чужое."""
+    priv = (it.get('extendedProperties') or {}).get('private') or {}
+    if not (priv.get('gd_id') or priv.get('src') == 'geodac'): return None
+    st = it.get('start') or {}
+    return {'gd_id': priv.get('gd_id'), 'hash': priv.get('gd_hash'), 'src': priv.get('src'),
+            'etag': it.get('etag'), 'start': st.get('dateTime') or st.get('date'), 'tz': st.get('timeZone')}
+
+def rfc3339(d):
+    return d.astimezone(timezone.utc).isoformat(timespec='seconds').replace('+00:00', 'Z')
+
+def list_records(service, cal_id, time_min=None, time_max=None, fields=LIST_FIELDS, on_item=None):
+    """Один проход листинга: id события -> запись (см. record_of).
+    На сервере: только src=geodac, окно [time_min, time_max) (None — без границы), поля fields;
+    on_item(it) — для каждого управляемого события (бэкап берёт тела отсюда)."""
+    recs = {}; pageToken = None
+    kw = {'privateExtendedProperty': 'src=geodac', 'fields': fields}
+    if time_min: kw['timeMin'] = rfc3339(time_min)
+    if time_max: kw['timeMax'] = rfc3339(time_max)
     while True:
         resp = service.events().list(calendarId=cal_id, maxResults=2500, singleEvents=True,
-                                     showDeleted=False, orderBy='startTime', pageToken=pageToken).execute()
+                                     showDeleted=False, pageToken=pageToken, **kw).execute()
         for it in resp.get('items', []):
-            priv = (it.get('extendedProperties') or {}).get('private') or {}
-            gid = priv.get('gd_id')
-            if gid and it.get('id'): mp[gid] = it['id']
+            r = record_of(it)
+            if r and it.get('id'):
+                recs[it['id']] = r
+                if on_item: on_item(it)
         pageToken = resp.get('nextPageToken')
         if not pageToken: break
-    return mp
+    return recs
+
+def existing_map(service, cal_id):
+    """gd_id -> {'id': id события, 'hash': gd_hash (None у событий без хэша)}."""
+    return by_gd(list_records(service, cal_id))
+
+def by_gd(recs):
+    return {r['gd_id']: {'id': i, 'hash': r['hash']} for i, r in recs.items() if r.get('gd_id')}
+
+class Mirror:
+    """Локальное зеркало управляемого календаря: id -> {gd_id, hash, etag, start, tz} + syncToken.
+    sync() тянет только изменения с прошлого раза (events.list?syncToken=...);
+    410 Gone (токен протух) -> полный пересинк. Успешные записи push применяются сразу."""
+    def __init__(self, calendar, root=None):
+        self.path = os.path.join(root or MIRROR_DIR, hashlib.sha1(calendar.encode('utf-8')).hexdigest()[:16] + '.json')
+        self.calendar = calendar
+        self.cal_id = None; self.token = None; self.recs = {}
+        try:
+            d = json.load(open(self.path, 'r', encoding='utf-8'))
+            if d.get('calendar') == calendar:
+                self.cal_id, self.token, self.recs = d.get('cal_id'), d.get('sync_token'), d.get('events') or {}
+        except Exception:
+            pass
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'calendar': self.calendar, 'cal_id': self.cal_id, 'sync_token': self.token,
+                       'events': self.recs}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def sync(self, service, cal_id, fields=LIST_FIELDS, on_item=None):
+        """on_item(it) — для каждого пришедшего управляемого события (полей — fields)."""
+        if cal_id != self.cal_id:
+            self.cal_id, self.token, self.recs = cal_id, None, {}
+        full = not self.token
+        try:
+            n = self._list(service, full, fields, on_item)
+        except HttpError as err:
+            if getattr(err, 'resp', None) is None or err.resp.status != 410: raise
+            print("[mirror] sync token expired, full resync", flush=True)
+            self.token, self.recs, full = None, {}, True
+            n = self._list(service, True, fields, on_item)
+        print(f"[mirror] {'full' if full else 'incremental'} sync: {n} changes, {len(self.recs)} managed events",
+              flush=True)
+        self.save()
+        return n
+
+    def _list(self, service, full, fields=LIST_FIELDS, on_item=None):
+        if full: self.recs = {}
+        n = 0; pageToken = None
+        while True:
+            # syncToken несовместим с privateExtendedProperty/timeMin — только проекция полей
+            kw = {'calendarId': self.cal_id, 'maxResults': 2500, 'singleEvents': True, 'pageToken': pageToken,
+                  'fields': fields}
+            if full: kw['showDeleted'] = False
+            else: kw['syncToken'] = self.token
+            resp = service.events().list(**kw).execute()
+            for it in resp.get('items', []):
+                n += 1
+                r = None if it.get('status') == 'cancelled' else record_of(it)
+                if r:
+                    self.recs[it['id']] = r
+                    if on_item: on_item(it)
+                else: self.recs.pop(it.get('id'), None)
+            pageToken = resp.get('nextPageToken')
+            if not pageToken:
+                self.token = resp.get('nextSyncToken') or self.token
+                return n
+
+    def applied(self, event_id, body=None, resp=None):
+        """Отразить успешную запись: body/resp — вставка/обновление, без них — удаление."""
+        if body is None:
+            self.recs.pop(event_id, None); return
+        it = dict(body, **(resp or {}))
+        r = record_of(it)
+        if r: self.recs[it.get('id') or event_id] = r
+
+class Journal:
+    """Append-only журнал прогона push (JSONL рядом с зеркалом, <sha>.journal.jsonl):
+      {"t":"plan", run, cal_id, insert:[[gd_id, hash]], update:[[gd_id, id, hash]], delete, prune}
+      {"t":"ok", op, gd, h, id}   — по каждой успешной записи, сразу на диск
+      {"t":"end", stats}          — прогон завершён
+    Нет "end" — прогон прерван: следующий продолжает цепочку. Выполненные записи,
+    чей (gd_id, hash) совпадает с текущим JSON, применяются к записям календаря до
+    планирования (не переотправляются, даже если листинг ещё их не видит) и
+    входят в итоговые счётчики."""
+    def __init__(self, calendar, root=None):
+        self.path = os.path.join(root or MIRROR_DIR,
+                                 hashlib.sha1(calendar.encode('utf-8')).hexdigest()[:16] + '.journal.jsonl')
+        self.f = None; self.run = None
+        self.done = []; self.runs = 0   # ok-записи и число прерванных прогонов цепочки
+        try:
+            lines = open(self.path, 'r', encoding='utf-8').read().splitlines()
+        except OSError:
+            lines = []
+        self.cal_id = None
+        for ln in lines:
+            try: r = json.loads(ln)
+            except ValueError: continue   # оборванная последняя строка
+            if r.get('t') == 'plan':
+                if r.get('cal_id') != self.cal_id: self.done = []; self.runs = 0
+                self.cal_id = r.get('cal_id'); self.runs += 1
+            elif r.get('t') == 'ok': self.done.append(r)
+            elif r.get('t') == 'end': self.done = []; self.runs = 0; self.cal_id = None
+
+    def resume(self, cal_id, desired, recs):
+        """Применить выполненное прерванным прогоном к recs (на месте). -> счётчики перенесённого."""
+        carried = {'inserted': 0, 'updated': 0, 'deleted': 0, 'pruned': 0}
+        if not self.done or cal_id != self.cal_id:
+            self.done = []; return carried
+        for r in self.done:
+            if r['op'] in ('insert', 'update'):
+                body = desired.get(r['gd'])
+                if body is None or body['extendedProperties']['private']['gd_hash'] != r['h']:
+                    continue   # JSON изменился — запись не засчитываем, перепланируется
+                # старая копия того же gd_id (вставка дошла, ответ потерян) — остаётся в recs
+                recs[r['id']] = {'gd_id': r['gd'], 'hash': r['h'], 'src': 'geodac', 'etag': None,
+                                 'start': body['start']['dateTime'], 'tz': body['start'].get('timeZone')}
+                carried['inserted' if r['op'] == 'insert' else 'updated'] += 1
+            else:
+                recs.pop(r['id'], None)
+                carried['deleted' if r['op'] == 'delete' else 'pruned'] += 1
+        print(f"[journal] resume after {self.runs} interrupted run(s): "
+              + ", ".join(f"{k}={v}" for k, v in carried.items()), flush=True)
+        return carried
+
+    def _write(self, rec):
+        self.f.write(json.dumps(rec, ensure_ascii=False, separators=(',', ':')) + '\n'); self.f.flush()
+
+    def begin(self, cal_id, desired, ops):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.f = open(self.path, 'a' if self.done else 'w', encoding='utf-8')
+        self.run = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        gh = lambda eid: desired[eid]['extendedProperties']['private']['gd_hash']
+        self._write({'t': 'plan', 'run': self.run, 'cal_id': cal_id,
+                     'insert': [[e, gh(e)] for e in ops['insert']],
+                     'update': [[e, i, gh(e)] for e, i in ops['update']],
+                     'delete': ops['delete'], 'prune': ops['prune']})
+
+    def ok(self, op, event_id, gd=None, h=None):
+        self._write({'t': 'ok', 'op': op, 'gd': gd, 'h': h, 'id': event_id})
+
+    def end(self, stats):
+        self._write({'t': 'end', 'run': self.run, 'stats': stats})
+        self.f.close(); self.f = None
+
+def start_of(r, tzname=None):
+    """Начало записи, aware. Наивное время (тела to_dt_local, записи журнала, ответы
+    fake/local) — в зоне события (tz), иначе календаря tzname, иначе UTC."""
+    if not r.get('start'): return None
+    try: t = duparser.parse(r['start'])
+    except Exception: return None
+    if t.tzinfo: return t
+    tz = r.get('tz') or tzname
+    return t.replace(tzinfo=(dutz.gettz(tz) if tz else None) or timezone.utc)
+
+def plan_ops(desired, recs, replace=False, prune_cutoff=None, window=None, tzname=None):
+    """Что сделать, чтобы календарь совпал с desired: -> dict insert/update/delete/prune/unchanged.
+    window=(t0, t1) ограничивает --replace событиями, начинающимися внутри окна;
+    tzname — зона календаря для наивных времён записей без своей."""
+    existing = by_gd(recs)
+    ops = {'insert': [], 'update': [], 'delete': [], 'prune': [], 'unchanged': 0}
+    for eid, body in desired.items():
+        cur = existing.get(eid)
+        if cur is None: ops['insert'].append(eid)
+        elif cur['hash'] == body['extendedProperties']['private']['gd_hash']: ops['unchanged'] += 1
+        else: ops['update'].append((eid, cur['id']))
+    if replace:
+        for i, r in recs.items():
+            if not r.get('gd_id') or r['gd_id'] in desired: continue
+            if window:
+                t = start_of(r, tzname)
+                if t is None or not (window[0] <= t < window[1]): continue
+            ops['delete'].append(i)
+    if prune_cutoff is not None:
+        gone = set(ops['delete'])
+        for i, r in recs.items():
+            if i in gone or r.get('src') != 'geodac': continue
+            t = start_of(r, tzname)
+            if t is not None and t < prune_cutoff: ops['prune'].append(i)
+    return ops
+
+def desired_window(desired, tzname):
+    """[min start − pad, max end + pad) событий JSON в UTC; None, если событий нет."""
+    ts = []
+    for b in desired.values():
+        for k in ('start', 'end'):
+            d = datetime.fromisoformat(b[k]['dateTime'])   # to_dt_local: isoformat без зоны
+            ts.append(d if d.tzinfo else d.replace(tzinfo=dutz.gettz(b[k].get('timeZone') or tzname)))
+    return (min(ts) - WINDOW_PAD, max(ts) + WINDOW_PAD) if ts else None
+
+def listing_bounds(window, replace_all=False, cutoff=None):
+    """Границы единственного листинга: окно JSON, расширенное под prune (всё до cutoff)
+    и под --replace по всему календарю (без границ)."""
+    if replace_all or window is None: return None, None
+    t0, t1 = window
+    if cutoff is not None: t0, t1 = None, max(t1, cutoff)
+    return t0, t1
+
+def prune_cutoff(days):
+    return datetime.now(timezone.utc) - timedelta(days=days) if days > 0 else None
+
+def desired_bodies(evs, tzname):
+    desired = {}
+    for e in evs:
+        if not (e.get('summary') and e.get('start') and e.get('end')): continue
+        eid = make_id(e)
+        desired[eid] = build_event(e, tzname, eid=eid)
+    return desired
+
+class TokenBucket:
+    """Общий на все потоки лимит запросов: rate токенов/с, не больше burst в запасе."""
+    def __init__(self, rate, burst):
+        self.rate = float(rate); self.burst = max(1.0, float(burst))
+        self.tokens = self.burst; self.t = time.monotonic()
+        self.lock = threading.Lock()
 
-def prune_before_days(service, cal_id, days):
+    def acquire(self, n=1):
+        if self.rate <= 0: return
+        n = min(n, self.burst)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.t) * self.rate); self.t = now
+                if self.tokens >= n:
+                    self.tokens -= n; return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+def is_transient(err):
+    """429, 5xx и 403 rate/quota-limit — повторяем; остальное — постоянная ошибка."""
+    if not isinstance(err, HttpError):
+        return isinstance(err, (OSError, TimeoutError))   # обрыв соединения, таймаут
+    status = getattr(err.resp, 'status', 0)
+    if status == 429 or status >= 500: return True
+    if status == 403:
+        body = (err.content or b'').decode('utf-8', 'replace') + str(err)
+        return any(r in body for r in ('rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded'))
+    return False
+
+_TLS = threading.local()
+def _thread_http(service):
+    """httplib2.Http не потокобезопасен: в рабочих потоках — свой AuthorizedHttp на тех же creds."""
+    if threading.current_thread() is threading.main_thread(): return None
+    h = getattr(_TLS, 'http', None)
+    if h is None:
+        creds = getattr(getattr(service, '_http', None), 'credentials', None)
+        if creds is not None:
+            import httplib2, google_auth_httplib2
+            h = _TLS.http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+    return h
+
+class Sender:
+    """Отправка запросов: batch-пачки по batch_size, пул из workers потоков, общий
+    TokenBucket (каждый подзапрос batch — токен; rate=0 — без лимита), повтор временных
+    ошибок с экспоненциальной паузой и джиттером; постоянные ошибки копятся в failures."""
+    def __init__(self, service, batch_size=BATCH_SIZE, workers=1, rate=0, burst=None, retries=RETRIES):
+        self.service = service; self.batch_size = max(1, batch_size); self.workers = max(1, workers)
+        self.limiter = TokenBucket(rate, burst or max(self.batch_size * 2, 10))
+        self.retries = retries
+        self.failures = []   # [{'op', 'key', 'status', 'error'}]
+        self.retried = 0
+        self.lock = threading.Lock()
+
+    def _send(self, chunk, on_ok):
+        """Один HTTP-запрос (batch или одиночный) -> {key: exc} упавших подзапросов."""
+        errs = {}; http = _thread_http(self.service)
+        kw = {'http': http} if http is not None else {}
+        def ok(key, resp):
+            if on_ok:
+                with self.lock: on_ok(key, resp)
+        if len(chunk) == 1 and self.batch_size <= 1:
+            key, req = chunk[0]
+            try: resp = req.execute(**kw)
+            except Exception as err: errs[key] = err
+            else: ok(key, resp)
+            return errs
+        def cb(rid, resp, exc):
+            if exc is not None: errs[rid] = exc
+            else: ok(rid, resp)
+        batch = self.service.new_batch_http_request(callback=cb)
+        for key, req in chunk:
+            batch.add(req, request_id=key)
+        try:
+            batch.execute(**kw)
+        except Exception as err:   # упал весь batch-запрос — ошибка у каждого элемента
+            for key, _req in chunk:
+                errs.setdefault(key, err)
+        return errs
+
+    def _run_chunk(self, chunk, on_ok):
+        pending = chunk; errors = {}
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire(len(pending))
+            errs = self._send(pending, on_ok)
+            again = [(k, r) for k, r in pending if k in errs and is_transient(errs[k])]
+            errors.update({k: e for k, e in errs.items() if not is_transient(e)})
+            if not again: break
+            if attempt == self.retries:
+                errors.update({k: errs[k] for k, _ in again}); break
+            with self.lock: self.retried += len(again)
+            time.sleep(min(60.0, (2 ** attempt)) * (0.5 + random.random()))
+            pending = again
+        return errors
+
+    def run(self, reqs, label, on_ok=None):
+        """reqs — [(key, http_request)]. on_ok(key, response) — для успешных.
+        -> {key: exc} для окончательно неудачных (они же в self.failures)."""
+        errors = {}
+        total = len(reqs)
+        if not total: return errors
+        step = max(1, total // 20)  # каждые ~5%
+        chunks = [reqs[i:i+self.batch_size] for i in range(0, total, self.batch_size)]
+        done = 0
+        def progress(n):
+            nonlocal done
+            prev, done = done, done + n
+            if prev == 0 or done == total or done // step != prev // step:
+                print(f"[gcal] {label} {done}/{total} ({done*100//total}%)", flush=True)
+        if self.workers == 1:
+            for ch in chunks:
+                errors.update(self._run_chunk(ch, on_ok)); progress(len(ch))
+        else:
+            from concurrent.futures import ThreadPoolExecutor, as_completed
+            with ThreadPoolExecutor(max_workers=self.workers) as ex:
+                futs = {ex.submit(self._run_chunk, ch, on_ok): len(ch) for ch in chunks}
+                for f in as_completed(futs):
+                    errors.update(f.result()); progress(futs[f])
+        for key, err in errors.items():
+            self.failures.append({'op': label, 'key': key, 'status': getattr(getattr(err, 'resp', None), 'status', None),
+                                  'error': str(err)[:500]})
+        return errors
+
+    def report(self, path=None):
+        """Итог по ошибкам: сводка по статусам в лог, полный список — в JSON (path)."""
+        if self.retried: print(f"[gcal] retried transient errors: {self.retried}")
+        if not self.failures: return
+        by = {}
+        for f in self.failures: by[(f['op'], f['status'])] = by.get((f['op'], f['status']), 0) + 1
+        print("[gcal] FAILED: " + ", ".join(f"{op}/{st}={n}" for (op, st), n in sorted(by.items(), key=str)),
+              file=sys.stderr, flush=True)
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            json.dump({'failures': self.failures}, open(path, 'w', encoding='utf-8'), ensure_ascii=False, indent=2)
+            print(f"[gcal] failure report: {path}", file=sys.stderr)
+
+def run_batched(service, reqs, label, batch_size=BATCH_SIZE, on_ok=None):
+    """Последовательная отправка пачками (см. Sender). -> {key: exc} для неудачных."""
+    return Sender(service, batch_size).run(reqs, label, on_ok)
+
+def prune_before_days(service, cal_id, days, batch_size=BATCH_SIZE):
     if days <= 0: return 0
-    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat(timespec='seconds').replace('+00:00','Z')
-    pageToken = None; del_cnt = 0
-    while True:
-        resp = service.events().list(calendarId=cal_id, maxResults=2500, singleEvents=True,
-                                     showDeleted=False, orderBy='startTime', timeMax=cutoff,
-                                     pageToken=pageToken).execute()
-        for it in resp.get('items', []):
-            priv = (it.get('extendedProperties') or {}).get('private') or {}
-            if priv.get('src') == 'geodac':
-                try:
-                    service.events().delete(calendarId=cal_id, eventId=it['id']).execute()
-                    del_cnt += 1
-                except HttpError:
-                    pass
-        pageToken = resp.get('nextPageToken')
-        if not pageToken: break
-    return del_cnt
+    cutoff = prune_cutoff(days)
+    ids = plan_ops({}, list_records(service, cal_id, time_max=cutoff), prune_cutoff=cutoff)['prune']
+    errors = run_batched(service, [(i, service.events().delete(calendarId=cal_id, eventId=i)) for i in ids],
+                         'prune', batch_size)
+    return len(ids) - len(errors)
 
 def main():
     ap = argparse.ArgumentParser(description="GeoDAC → Google Calendar writer (upsert + prune)")
@@ -135,65 +513,158 @@ def main():
     ap.add_argument('--tz', default='Europe/Moscow')
     ap.add_argument('--creds', default=os.path.expanduser('~/astro/.gcal'))
     ap.add_argument('--replace', action='store_true')
+    ap.add_argument('--replace-scope', choices=('all', 'window'), default='all',
+                    help='--replace deletes extras in the whole calendar (all) or only inside the JSON time window')
     ap.add_argument('--prune-before-days', type=int, default=0)
+    ap.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                    help='Requests per Calendar batch call (1 = one HTTP request per event)')
+    ap.add_argument('--workers', type=int, default=1, help='Concurrent batch senders (threads)')
+    ap.add_argument('--rate', type=float, default=RATE,
+                    help='Shared request budget, requests/second across workers (0 = unlimited)')
+    ap.add_argument('--burst', type=int, default=None, help='Token bucket size (default 2x batch size)')
+    ap.add_argument('--retries', type=int, default=RETRIES, help='Retries for 429/5xx/rate-limit 403 with backoff')
+    ap.add_argument('--failure-report', metavar='PATH', help='Write permanently failed operations to PATH (JSON)')
+    ap.add_argument('--backend', default=os.environ.get('GEODAC_GCAL_BACKEND', 'google'),
+                    help="google | local:DIR (JSON+ICS files) | fake[:latency=S,errors=P,batch_errors=P,status=429/503,seed=N]")
+    ap.add_argument('--no-mirror', action='store_true',
+                    help='Do not use the local mirror (~/astro/.state/gcal_mirror); list the calendar in full')
+    ap.add_argument('--no-journal', action='store_true',
+                    help='Do not keep the resumable push journal (next to the mirror)')
+    ap.add_argument('--backup', action='store_true',
+                    help='Snapshot the calendar before writing (gcal_backup.py list/restore)')
+    ap.add_argument('--plan', action='store_true',
+                    help='Offline: print inserts/updates/deletes computed from the local mirror, no API calls')
     args = ap.parse_args()
 
-    service = ensure_service(args.creds)
-    cal_id = get_or_create_calendar(service, args.calendar, args.tz)
-
     data = json.load(open(args.json, 'r', encoding='utf-8'))
     evs = data.get('events', [])
+    if args.plan:
+        # зеркало там же, где его ведёт push для этого бэкенда; google не открываем — без API
+        m = Mirror(args.calendar) if args.backend in ('', 'google') else \
+            backend_mirror(open_backend(args.backend, args.creds), args.calendar)
+        if m is None: print(f"[plan] backend {args.backend} keeps no mirror", file=sys.stderr); sys.exit(2)
+        ops = show_plan(evs, args.calendar, args.tz, args.replace, args.prune_before_days, args.replace_scope, m)
+        sys.exit(2 if ops is None else 0)
+
+    service = open_backend(args.backend, args.creds)
+    cal_id = get_or_create_calendar(service, args.calendar, args.tz)
+
     if not evs: print("No events in JSON"); sys.exit(0)
+    mirror = None if args.no_mirror else backend_mirror(service, args.calendar)
+    journal = None if args.no_journal else backend_journal(service, args.calendar)
+    sender = Sender(service, args.batch_size, args.workers, args.rate, args.burst, args.retries)
+    st = push_events(service, cal_id, evs, args.tz, replace=args.replace, prune_days=args.prune_before_days,
+                     mirror=mirror, replace_scope=args.replace_scope, sender=sender, journal=journal,
+                     backup=backend_backup(service, args.calendar) if args.backup else None)
+    sender.report(args.failure_report)
+    print("[gcal] summary: " + " ".join(f"{k}={v}" for k, v in st.items()))
+    if hasattr(service, 'flush'):   # офлайн-бэкенд: сохранить состояние, итог
+        service.flush(); print(service.summary())
+    if st['failed']: sys.exit(1)
 
-    desired = {}
-    for e in evs:
-        if not (e.get('summary') and e.get('start') and e.get('end')): continue
-        eid = make_id(e)
-        desired[eid] = build_event(e, args.tz, eid=eid)
+def backend_mirror(service, calendar):
+    """Зеркало под бэкенд: у local — в его каталоге, у in-memory fake — не нужно."""
+    root = getattr(service, 'mirror_root', MIRROR_DIR)
+    return Mirror(calendar, root) if root else None
+
+def backend_backup(service, calendar):
+    """gcal_backup.Store под бэкенд (у local — в его каталоге, у in-memory fake — нет)."""
+    import gcal_backup
+    root = getattr(service, 'backup_root', gcal_backup.ROOT)
+    return gcal_backup.Store(calendar, root) if root else None
+
+def backend_journal(service, calendar):
+    root = getattr(service, 'mirror_root', MIRROR_DIR)
+    return Journal(calendar, root) if root else None
+
+def push_events(service, cal_id, evs, tzname, replace=False, prune_days=0, batch_size=BATCH_SIZE, mirror=None,
+                replace_scope='all', sender=None, journal=None, backup=None):
+    """События JSON -> тела (desired_bodies) -> push_bodies."""
+    return push_bodies(service, cal_id, desired_bodies(evs, tzname), tzname, replace, prune_days, batch_size,
+                       mirror, replace_scope, sender, journal, backup)
 
-    existing = existing_map(service, cal_id)
-    ins = upd = 0
+def push_bodies(service, cal_id, desired, tzname, replace=False, prune_days=0, batch_size=BATCH_SIZE, mirror=None,
+                replace_scope='all', sender=None, journal=None, backup=None):
+    """Upsert тел событий (gd_id -> body) в календарь (+ удаление лишних при replace, prune старых).
+    Состояние календаря — из mirror (инкрементальный sync) или одного фильтрованного
+    листинга на все три задачи; запросы уходят batch-пачками.
+    replace_scope='window' — --replace только в окне событий JSON.
+    sender — Sender (пул/лимит/повторы); по умолчанию последовательный с batch_size.
+    journal — Journal: продолжение прерванного прогона, счётчики — за всю цепочку.
+    backup — gcal_backup.Store: снимок календаря по этим же записям до записи.
+    -> счётчики inserted/updated/unchanged/deleted/pruned/failed/delete_failed/resumed."""
+    sender = sender or Sender(service, batch_size)
+    cutoff = prune_cutoff(prune_days)
+    window = desired_window(desired, tzname) if replace_scope == 'window' else None
+    # с бэкапом листинг несёт тела — объекты бэкапа без отдельных запросов
+    fields, on_item = (backup.FIELDS, backup.seen) if backup is not None else (LIST_FIELDS, None)
+    if mirror is not None:
+        mirror.sync(service, cal_id, fields, on_item)
+        recs = mirror.recs
+    else:
+        replace_all = replace and replace_scope == 'all'
+        t0, t1 = listing_bounds(None if replace_all else (window or desired_window(desired, tzname)),
+                                replace_all, cutoff)
+        recs = list_records(service, cal_id, t0, t1, fields, on_item)
+    if backup is not None: backup.snapshot(service, cal_id, recs)
+    carried = journal.resume(cal_id, desired, recs) if journal is not None else {}
+    ops = plan_ops(desired, recs, replace, cutoff, window, tzname)
+    if journal is not None: journal.begin(cal_id, desired, ops)
     total = len(desired)
-    step = max(1, total // 20)  # каждые ~5%
-    print(f"[gcal] upsert start: total={total}", flush=True)
-    for idx, (eid, body) in enumerate(desired.items(), 1):
-        try:
-            if eid in existing:
-                service.events().update(calendarId=cal_id, eventId=existing[eid], body=body).execute()
-                upd += 1
-            else:
-                service.events().insert(calendarId=cal_id, body=body).execute()
-                ins += 1
-        except HttpError as err:
-            print(f"[gcal] ERROR eid={eid} idx={idx}/{total}: {err}", file=sys.stderr, flush=True)
-            raise
-        if idx == 1 or idx == total or (idx % step == 0):
-            print(f"[gcal] upsert {idx}/{total} ({idx*100//total}%)", flush=True)
-    print(f"Upsert done: inserted={ins}, updated={upd}, total={len(desired)}")
-
-    if args.replace:
-        print("[gcal] replace: scanning and deleting extras...", flush=True)
-        pageToken = None; del_cnt=0
-        while True:
-            resp = service.events().list(calendarId=cal_id, maxResults=2500, singleEvents=True,
-                                         showDeleted=False, orderBy='startTime', pageToken=pageToken).execute()
-            for it in resp.get('items', []):
-                priv = (it.get('extendedProperties') or {}).get('private') or {}
-                gid = priv.get('gd_id')
-                if gid and gid not in desired:
-                    try:
-                        service.events().delete(calendarId=cal_id, eventId=it['id']).execute()
-                        del_cnt+=1
-                        if del_cnt % 50 == 0:
-                            print(f"[gcal] replace deleted {del_cnt}...", flush=True)
-                    except HttpError:
-                        pass
-            pageToken = resp.get('nextPageToken')
-            if not pageToken: break
-        print(f"Replace mode: deleted={del_cnt}")
+    print(f"[gcal] upsert start: total={total}, existing={len(by_gd(recs))}", flush=True)
+
+    upd_ids = {eid for eid, _ in ops['update']}
+    def ok_write(eid, resp):
+        if mirror is not None: mirror.applied((resp or {}).get('id'), desired[eid], resp)
+        if backup is not None: backup.stored(dict(desired[eid], **(resp or {})))
+        if journal is not None:
+            journal.ok('update' if eid in upd_ids else 'insert', (resp or {}).get('id'), eid,
+                       desired[eid]['extendedProperties']['private']['gd_hash'])
+    reqs = [(eid, service.events().insert(calendarId=cal_id, body=desired[eid])) for eid in ops['insert']]
+    reqs += [(eid, service.events().update(calendarId=cal_id, eventId=i, body=desired[eid])) for eid, i in ops['update']]
+    errors = sender.run(reqs, 'upsert', on_ok=ok_write)
+    for eid, err in errors.items():
+        print(f"[gcal] ERROR eid={eid} {'upd' if eid in upd_ids else 'ins'}: {err}", file=sys.stderr, flush=True)
+    # перенесённые из журнала записи планировщик видит как unchanged — считаем их по операции
+    resumed = carried.get('inserted', 0) + carried.get('updated', 0)
+    ins = sum(1 for eid in ops['insert'] if eid not in errors) + carried.get('inserted', 0)
+    upd = sum(1 for eid in upd_ids if eid not in errors) + carried.get('updated', 0)
+    unchanged = ops['unchanged'] - resumed
+    st = {'inserted': ins, 'updated': upd, 'unchanged': unchanged, 'deleted': carried.get('deleted', 0),
+          'pruned': carried.get('pruned', 0), 'failed': len(errors), 'delete_failed': 0, 'resumed': resumed}
+    print(f"Upsert done: inserted={ins}, updated={upd}, unchanged={unchanged}, failed={len(errors)}, total={total}"
+          + (f" (resumed {resumed} from journal)" if resumed else ""))
+
+    for kind, label in (('delete', 'replace'), ('prune', 'prune')):
+        ids = ops[kind]
+        if not ids: continue
+        def ok_delete(i, _resp, kind=kind):
+            if mirror is not None: mirror.applied(i)
+            if journal is not None: journal.ok(kind, i)
+        err = sender.run([(i, service.events().delete(calendarId=cal_id, eventId=i)) for i in ids],
+                         label, on_ok=ok_delete)
+        st['deleted' if kind == 'delete' else 'pruned'] += len(ids) - len(err)
+        st['delete_failed'] += len(err)
+    if replace:
+        print(f"Replace mode: deleted={st['deleted']}")
+    if prune_days > 0:
+        print(f"Pruned older than {prune_days}d: {st['pruned']}")
+    if mirror is not None: mirror.save()
+    if journal is not None: journal.end(st)
+    return st
 
-    if args.prune_before_days > 0:
-        pruned = prune_before_days(service, cal_id, args.prune_before_days)
-        print(f"Pruned older than {args.prune_before_days}d: {pruned}")
+def show_plan(evs, calendar, tzname, replace=False, prune_days=0, replace_scope='all', mirror=None):
+    """--plan: операции по локальному зеркалу (mirror, по умолчанию Mirror(calendar)), без обращений к API."""
+    m = mirror or Mirror(calendar)
+    if m.cal_id is None:
+        print(f"[plan] no mirror for '{calendar}' yet ({m.path}); run a push once", file=sys.stderr)
+        return None
+    desired = desired_bodies(evs, tzname)
+    window = desired_window(desired, tzname) if replace_scope == 'window' else None
+    ops = plan_ops(desired, m.recs, replace, prune_cutoff(prune_days), window, tzname)
+    print(f"[plan] {calendar}: insert={len(ops['insert'])} update={len(ops['update'])} "
+          f"unchanged={ops['unchanged']} delete={len(ops['delete'])} prune={len(ops['prune'])} "
+          f"(mirror: {len(m.recs)} events)")
+    return ops
 
 if __name__ == '__main__': main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Кэш стартовых данных render_for_ics: YAML (config.yaml, glyphs.yaml) и словари
+# композера (composer.load_dicts()) — в pickle, с проверкой источников.
+#
+# Источник считается неизменным, если совпали (mtime_ns, size), а при расхождении —
+# sha1 содержимого (touch без правки не сбрасывает кэш). Какие файлы читает
+# load_dicts, мы не знаем: при пересборке записываем всё, что открыто на чтение
+# (builtins.open / io.open), и каталоги этих файлов (mtime каталога меняется при
+# добавлении/удалении файла). Непиклящиеся словари просто не кэшируются.
+#
+#
+# DescCache — готовые описания событий между прогонами: ключ — входы описания
+# (transit/aspect/target/signs/houses/axis) + версия (исходники композера, глифы,
+# сам render_for_ics), LRU с ограничением числа записей.
+#
+#   GEODAC_RENDER_CACHE=DIR  — каталог кэша (по умолчанию ~/astro/.cache/render)
+#   GEODAC_RENDER_CACHE=0    — выключить
+#   GEODAC_DESC_CACHE_SIZE=50000 — максимум описаний
+import os, sys, io, hashlib, pickle, builtins
+from collections import OrderedDict
+from contextlib import contextmanager
+
+VERSION = 1
+_ENV = os.environ.get('GEODAC_RENDER_CACHE', '')
+CACHE_DIR = os.path.expanduser(_ENV if _ENV not in ('', '1', '0', 'no', 'off') else '~/astro/.cache/render')
+DESC_MAX = int(os.environ.get('GEODAC_DESC_CACHE_SIZE', 50000))
+COMPOSER_VERSION = None   # хэш источников словарей последнего composer_dicts()
+
+def enabled():
+    return os.environ.get('GEODAC_RENDER_CACHE', '1') not in ('0', 'no', 'off')
+
+def sha1_file(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''): h.update(chunk)
+    return h.hexdigest()
+
+def signature(path):
+    """(path, mtime_ns, size, sha1); у каталога sha1 = None."""
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size, None if os.path.isdir(path) else sha1_file(path))
+
+def fresh(sig):
+    path, mtime, size, sha = sig
+    try: st = os.stat(path)
+    except OSError: return False
+    if (st.st_mtime_ns, st.st_size) == (mtime, size): return True
+    return sha is not None and st.st_size == size and sha1_file(path) == sha
+
+def _entry_path(kind, key):
+    return os.path.join(CACHE_DIR, f"{kind}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.pickle")
+
+def _load(kind, key):
+    try:
+        with open(_entry_path(kind, key), 'rb') as f: e = pickle.load(f)
+    except Exception:
+        return None
+    if e.get('v') != VERSION or e.get('key') != key: return None
+    return e if all(fresh(s) for s in e['deps']) else None
+
+def _save(kind, key, deps, data):
+    try:
+        blob = pickle.dumps({'v': VERSION, 'key': key, 'deps': deps, 'data': data}, pickle.HIGHEST_PROTOCOL)
+    except Exception as err:
+        print(f"[render-cache] {kind}: not cacheable ({type(err).__name__}: {err})", file=sys.stderr)
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    p = _entry_path(kind, key); tmp = f"{p}.tmp.{os.getpid()}"
+    with open(tmp, 'wb') as f: f.write(blob)
+    os.replace(tmp, p)
+
+@contextmanager
+def track_reads():
+    """Собрать пути файлов, открытых на чтение внутри блока."""
+    seen = []; orig = builtins.open
+    def tracking_open(file, mode='r', *a, **kw):
+        if isinstance(file, (str, bytes, os.PathLike)) and not any(c in mode for c in 'wax+'):
+            seen.append(os.path.abspath(os.fsdecode(file)))
+        return orig(file, mode, *a, **kw)
+    builtins.open = io.open = tracking_open
+    try:
+        yield seen
+    finally:
+        builtins.open = io.open = orig
+
+def _deps(paths, src):
+    # mtime каталога самого композера (~/astro) и каталога кэша не берём — туда пишет
+    # каждый прогон (merged JSON, чекпойнты, зеркала); файлы в них отслеживаются как обычно
+    skip = {os.path.dirname(src), os.path.abspath(CACHE_DIR)}
+    out = {src: signature(src)}
+    for p in paths:
+        for q in (p, os.path.dirname(p)):
+            if q not in out and q not in skip and os.path.exists(q): out[q] = signature(q)
+    return sorted(out.values())
+
+def cached_file(path, parse):
+    """parse(path) с кэшем по содержимому path (для YAML/JSON конфигов)."""
+    path = os.path.abspath(path)
+    if not enabled(): return parse(path)
+    e = _load('file', path)
+    if e is not None: return e['data']
+    data = parse(path)
+    _save('file', path, [signature(path)], data)
+    return data
+
+def _version(deps):
+    return hashlib.sha1(repr([(p, sha) for p, _m, _s, sha in deps if sha]).encode('utf-8')).hexdigest()[:16]
+
+def composer_dicts(composer, src):
+    """composer.load_dicts() с кэшем: ключ — исходник композера, зависимости — всё прочитанное."""
+    global COMPOSER_VERSION
+    src = os.path.abspath(src)
+    if not enabled():
+        COMPOSER_VERSION = None
+        return composer.load_dicts()
+    e = _load('dicts', src)
+    if e is not None:
+        COMPOSER_VERSION = _version(e['deps'])
+        return e['data']
+    with track_reads() as seen:
+        data = composer.load_dicts()
+    deps = _deps(seen, src)
+    COMPOSER_VERSION = _version(deps)
+    _save('dicts', src, deps, data)
+    print(f"[render-cache] composer dicts rebuilt ({len(deps)} sources)", file=sys.stderr)
+    return data
+
+class DescCache:
+    """Персистентный LRU: ключ (bytes) -> текст. Весь файл читается один раз, пишется в save()."""
+    def __init__(self, name='desc', maxsize=DESC_MAX):
+        self.path = os.path.join(CACHE_DIR, name + '.pickle')
+        self.maxsize = maxsize if enabled() else 0
+        self.data = OrderedDict(); self.dirty = False
+        self.hits = self.misses = self.evictions = 0
+        if self.maxsize:
+            try:
+                with open(self.path, 'rb') as f: e = pickle.load(f)
+                if e.get('v') == VERSION: self.data = e['data']
+            except Exception:
+                pass
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha1(repr(parts).encode('utf-8')).digest()
+
+    def peek(self, key):
+        """Текст или None (промах засчитывается в put)."""
+        v = self.data.get(key)
+        if v is not None:
+            self.hits += 1; self.data.move_to_end(key)
+        return v
+
+    def put(self, key, v):
+        self.misses += 1
+        if self.maxsize:
+            self.data[key] = v; self.dirty = True
+
+    def get(self, key, make):
+        """Текст по ключу; при промахе — make() и запомнить."""
+        v = self.peek(key)
+        if v is None:
+            v = make(); self.put(key, v)
+        return v
+
+    def save(self):
+        if not (self.maxsize and (self.dirty or self.hits)): return
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False); self.evictions += 1
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp, 'wb') as f:
+            pickle.dump({'v': VERSION, 'data': self.data}, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def summary(self):
+        n = self.hits + self.misses
+        return (f"desc cache hits={self.hits} misses={self.misses}"
+                + (f" ({self.hits / n:.0%})" if n else "") + f" size={len(self.data)}")
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
-import os, sys, json, hashlib, importlib.util, re
+import os, json, hashlib, importlib.util, re
 from datetime import datetime, timezone
+import render_cache, intervals
 
 try:
     import yaml
@@ -9,12 +10,15 @@ except Exception:
 
 ASTRO = os.path.expanduser('~/astro')
 
+def _parse_yaml(p):
+    import yaml as _yaml
+    return _yaml.safe_load(open(p, 'r', encoding='utf-8')) or {}
+
 def load_yaml(path, default=None):
     try:
         p = os.path.expanduser(path)
         if not os.path.exists(p): return default or {}
-        import yaml as _yaml
-        return _yaml.safe_load(open(p, 'r', encoding='utf-8')) or {}
+        return render_cache.cached_file(p, _parse_yaml) or {}
     except Exception:
         return default or {}
 
@@ -93,12 +97,23 @@ def stable_id(ev):
         base = json.dumps(ev, ensure_ascii=False, sort_keys=True)
     return "gd" + hashlib.sha1(base.encode('utf-8')).hexdigest()
 
+_COMPOSER = {}
 def load_composer():
+    """Модуль композера (один exec на процесс, пока файл не изменился)."""
     p = os.path.join(ASTRO, 'compose_aspect_text.py')
     if not os.path.exists(p): return None
-    spec = importlib.util.spec_from_file_location('composer', p)
-    mod = importlib.util.module_from_spec(spec); spec.loader.exec_module(mod)
-    return mod
+    key = (p, os.stat(p).st_mtime_ns)
+    if key not in _COMPOSER:
+        spec = importlib.util.spec_from_file_location('composer', p)
+        mod = importlib.util.module_from_spec(spec); spec.loader.exec_module(mod)
+        _COMPOSER.clear(); _COMPOSER[key] = mod
+    return _COMPOSER[key]
+
+def load_dicts(composer):
+    """composer.load_dicts() через render_cache (pickle, сброс по изменению источников)."""
+    if not (composer and hasattr(composer, 'load_dicts')): return None
+    src = getattr(composer, '__file__', None)
+    return render_cache.composer_dicts(composer, src) if src else composer.load_dicts()
 
 # NOTE (transit-to-natal overlay):
 # - Интерпретация домов (houses.tr/houses.nat) относится к транзитам по наталу.
@@ -201,44 +216,22 @@ def make_description_with_composer(ev, composer, dcts):
 
 # Встроенная склейка осей (MC/IC и ASC/DSC)
 def axis_unify_events(events, composer=None, dcts=None, tzname='Europe/Moscow'):
-    try:
-        from zoneinfo import ZoneInfo
-    except Exception:
-        ZoneInfo = None
     AX_VERT = {'MC','IC'}
     AX_HOR  = {'ASC','DSC','DESC'}
     ASPS_ORDER = {'□':0,'☍':1,'△':2,'✶':3}
-    def pdt(x):
-        if x is None: return None
-        if isinstance(x, dict): x = x.get('dateTime') or x.get('date') or x
-        s=str(x).strip()
-        if not s: return None
-        s=s.replace('Z','+00:00')
-        for cand in (s, s.replace(' ','T')):
-            try:
-                d=datetime.fromisoformat(cand)
-                if d.tzinfo is None and ZoneInfo:
-                    d=d.replace(tzinfo=ZoneInfo(tzname))
-                if d.tzinfo is None:
-                    d=d.replace(tzinfo=timezone.utc)
-                return d.astimezone(timezone.utc)
-            except: pass
-        return None
-    def tstr(d): return d.isoformat().replace('+00:00','Z') if d else ''
-    from datetime import timedelta
-    def overlap(a0,a1,b0,b1, pad=timedelta(hours=6)):
-        if not a0 or not b0: return False
-        A0, A1 = (a0, a1 or a0); B0, B1 = (b0, b1 or b0)
-        return max(A0,B0) <= (min(A1,B1) + pad)
-    groups = {}; rest_idx=[]
+    # осевые события: время разбираем один раз, кластеры — intervals.clusters по (ось, транзит)
+    items=[]
     for i,e in enumerate(events):
         tgt = (e.get('target') or '').upper()
-        if tgt in AX_VERT:
-            key=('VERT', (e.get('transit') or '').upper()); groups.setdefault(key, []).append(i)
-        elif tgt in AX_HOR:
-            key=('HOR',  (e.get('transit') or '').upper()); groups.setdefault(key, []).append(i)
-        else:
-            rest_idx.append(i)
+        axis = 'VERT' if tgt in AX_VERT else 'HOR' if tgt in AX_HOR else None
+        if not axis: continue
+        asp_raw = e.get('aspect') or ''
+        asp_g = asp_raw if asp_raw in ('☌','☍','□','△','✶') else glyph_aspect(asp_raw)
+        t0 = intervals.parse_utc(e.get('start') or e.get('peak'), tzname)
+        t1 = intervals.parse_utc(e.get('end')   or e.get('peak'), tzname)
+        items.append({'i': i,'asp': asp_g,'tgt': tgt,'t0': t0,'t1': t1,'e': e,
+                      'g': (axis, (e.get('transit') or '').upper()),
+                      's0': intervals.epoch(t0),'s1': intervals.epoch(t1)})
     to_remove=set(); new_events=[]
     def compose_desc(ev0):
         if composer and dcts:
@@ -247,71 +240,50 @@ def axis_unify_events(events, composer=None, dcts=None, tzname='Europe/Moscow'):
             except Exception:
                 return ''
         return ''
-    for key, idxs in groups.items():
-        axis, tr = key
-        if len(idxs) < 2: continue
-        items=[]
-        for i in idxs:
-            e=events[i]
-            asp_raw = e.get('aspect') or ''
-            asp_g = asp_raw if asp_raw in ('☌','☍','□','△','✶') else glyph_aspect(asp_raw)
-            items.append({'i': i,'asp': asp_g,'tgt': (e.get('target') or '').upper(),
-                          't0': pdt(e.get('start') or e.get('peak')),
-                          't1': pdt(e.get('end')   or e.get('peak')),
-                          'e' : e})
-        items.sort(key=lambda x: x['t0'] or datetime.max.replace(tzinfo=timezone.utc))
-        clusters=[]; cur=[]
-        for it in items:
-            if not cur: cur=[it]; continue
-            a0,a1 = cur[-1]['t0'], (cur[-1]['t1'] or cur[-1]['t0'])
-            b0,b1 = it['t0'],     (it['t1'] or it['t0'])
-            if overlap(a0,a1,b0,b1): cur.append(it)
-            else: clusters.append(cur); cur=[it]
-        if cur: clusters.append(cur)
-        for cl in clusters:
-            tgts = {x['tgt'] for x in cl}
-            if not (('MC' in tgts and 'IC' in tgts) or ('ASC' in tgts and ('DSC' in tgts or 'DESC' in tgts))): continue
-            c_t0 = min(x['t0'] for x in cl if x['t0'])
-            c_t1 = max((x['t1'] or x['t0']) for x in cl if (x['t1'] or x['t0']))
-            aspects = sorted({x['asp'] for x in cl}, key=lambda z: ASPS_ORDER.get(z,9))
-            asp_str = aspects[0] if len(aspects)==1 else '/'.join(aspects)
-            axis_label = 'вертикали (MC/IC)' if axis=='VERT' else 'горизонтали (ASC/DSC)'
-            from collections import Counter
-            h_tr_vals=[]; nat_sign_vals=set(); tr_sign_vals=[]
-            for x in cl:
-                h=(x['e'].get('houses') or {})
-                s=(x['e'].get('signs')  or {})
-                if isinstance(h,dict) and h.get('tr') is not None: h_tr_vals.append(h.get('tr'))
-                if isinstance(s,dict):
-                    if s.get('tr'):  tr_sign_vals.append(s.get('tr'))
-                    if s.get('nat'): nat_sign_vals.add(s.get('nat'))
-            htr = Counter(h_tr_vals).most_common(1)[0][0] if h_tr_vals else None
-            tr_sign = Counter(tr_sign_vals).most_common(1)[0][0] if tr_sign_vals else None
-            homes_to = 'H10/H4' if axis=='VERT' else 'H1/H7'
-            signs_line = None
-            if tr_sign and nat_sign_vals:
-                signs_line = f"{sign_glyph(tr_sign)}→" + "/".join(sign_glyph(z) for z in sorted(nat_sign_vals))
-            def asp_weight(a): return ASPS_ORDER.get(a, 9)
-            base_ev = sorted([x for x in cl], key=lambda x: (asp_weight(x['asp']), x['t0'] or datetime.max.replace(tzinfo=timezone.utc)))[0]['e']
-            base_desc = compose_desc(base_ev) or (base_ev.get('description') or '')
-            base_lines=[ln for ln in (base_desc or '').splitlines() if not re.match(r'^\s*(Знаки|Дома|Совет)\s*:', ln)]
-            base_norm = "\n".join([ln for ln in base_lines if ln.strip()]).strip()
-            hdr = ["Склейка по " + axis_label + ":"] + [
-                f"• {x['asp']} {x['tgt']}: {x['t0'].isoformat().replace('+00:00','Z')} → {(x['t1'] or x['t0']).isoformat().replace('+00:00','Z')}" for x in cl
-            ]
-            parts = ["\n".join(hdr)]
-            if base_norm: parts += ["", base_norm]
-            extras=[]
-            if signs_line: extras.append(f"Знаки: {signs_line}")
-            if htr is not None: extras.append(f"Дома: H{htr} → {homes_to}")
-            if extras: parts += [""] + extras
-            summary = f"{glyph_body(tr)} {asp_str} к {axis_label}" + (f" (H{htr})" if htr is not None else "")
-            new_e = {'summary': summary,'start': c_t0.isoformat().replace('+00:00','Z'),
-                     'end': c_t1.isoformat().replace('+00:00','Z'),
-                     'description': "\n".join(parts).strip(),
-                     'axis_unify': '1','axis': axis}
-            new_events.append(new_e)
-            for x in cl: to_remove.add(x['i'])
+    for (axis, tr), cl in intervals.clusters(items, lambda x: x['g'], lambda x: x['s0'], lambda x: x['s1']):
+        tgts = {x['tgt'] for x in cl}
+        if not (('MC' in tgts and 'IC' in tgts) or ('ASC' in tgts and ('DSC' in tgts or 'DESC' in tgts))): continue
+        c_t0 = min(x['t0'] for x in cl if x['t0'])
+        c_t1 = max((x['t1'] or x['t0']) for x in cl if (x['t1'] or x['t0']))
+        aspects = sorted({x['asp'] for x in cl}, key=lambda z: ASPS_ORDER.get(z,9))
+        asp_str = aspects[0] if len(aspects)==1 else '/'.join(aspects)
+        axis_label = 'вертикали (MC/IC)' if axis=='VERT' else 'горизонтали (ASC/DSC)'
+        from collections import Counter
+        h_tr_vals=[]; nat_sign_vals=set(); tr_sign_vals=[]
+        for x in cl:
+            h=(x['e'].get('houses') or {})
+            s=(x['e'].get('signs')  or {})
+            if isinstance(h,dict) and h.get('tr') is not None: h_tr_vals.append(h.get('tr'))
+            if isinstance(s,dict):
+                if s.get('tr'):  tr_sign_vals.append(s.get('tr'))
+                if s.get('nat'): nat_sign_vals.add(s.get('nat'))
+        htr = Counter(h_tr_vals).most_common(1)[0][0] if h_tr_vals else None
+        tr_sign = Counter(tr_sign_vals).most_common(1)[0][0] if tr_sign_vals else None
+        homes_to = 'H10/H4' if axis=='VERT' else 'H1/H7'
+        signs_line = None
+        if tr_sign and nat_sign_vals:
+            signs_line = f"{sign_glyph(tr_sign)}→" + "/".join(sign_glyph(z) for z in sorted(nat_sign_vals))
+        def asp_weight(a): return ASPS_ORDER.get(a, 9)
+        base_ev = sorted([x for x in cl], key=lambda x: (asp_weight(x['asp']), x['t0'] or datetime.max.replace(tzinfo=timezone.utc)))[0]['e']
+        base_desc = compose_desc(base_ev) or (base_ev.get('description') or '')
+        base_lines=[ln for ln in (base_desc or '').splitlines() if not re.match(r'^\s*(Знаки|Дома|Совет)\s*:', ln)]
+        base_norm = "\n".join([ln for ln in base_lines if ln.strip()]).strip()
+        hdr = ["Склейка по " + axis_label + ":"] + [
+            f"• {x['asp']} {x['tgt']}: {x['t0'].isoformat().replace('+00:00','Z')} → {(x['t1'] or x['t0']).isoformat().replace('+00:00','Z')}" for x in cl
+        ]
+        parts = ["\n".join(hdr)]
+        if base_norm: parts += ["", base_norm]
+        extras=[]
+        if signs_line: extras.append(f"Знаки: {signs_line}")
+        if htr is not None: extras.append(f"Дома: H{htr} → {homes_to}")
+        if extras: parts += [""] + extras
+        summary = f"{glyph_body(tr)} {asp_str} к {axis_label}" + (f" (H{htr})" if htr is not None else "")
+        new_e = {'summary': summary,'start': c_t0.isoformat().replace('+00:00','Z'),
+                 'end': c_t1.isoformat().replace('+00:00','Z'),
+                 'description': "\n".join(parts).strip(),
+                 'axis_unify': '1','axis': axis}
+        new_events.append(new_e)
+        for x in cl: to_remove.add(x['i'])
     out=[]
     for i,e in enumerate(events):
         if i in to_remove: continue
@@ -404,15 +376,78 @@ def normalize_axis_event(ev: dict) -> dict:
         ev.pop('houses', None)
 
     return ev
-def transform(in_path, out_path):
-    composer = load_composer()
-    dcts = composer.load_dicts() if composer and hasattr(composer,'load_dicts') else None
+def transform(in_path, out_path, jobs=1):
     data = json.load(open(os.path.expanduser(in_path), 'r', encoding='utf-8'))
     events = data.get('events') if isinstance(data, dict) else data
+    out = {'events': render_events(events, jobs)}
+    with open(os.path.expanduser(out_path), 'w', encoding='utf-8') as f:
+        json.dump(out, f, ensure_ascii=False, indent=2)
+    print(f"OK: wrote {len(out['events'])} events -> {out_path}")
+
+def _desc_inputs(ev):
+    """Всё, от чего зависит описание из композера/fallback (ключ DescCache)."""
+    sg = ev.get('signs') if isinstance(ev.get('signs'), dict) else {}
+    hs = ev.get('houses') if isinstance(ev.get('houses'), dict) else {}
+    return (ev.get('transit'), ev.get('aspect'), ev.get('target'), ev.get('axis'),
+            sg.get('tr'), sg.get('nat'), hs.get('tr'), hs.get('nat'), hs.get('tg'))
+
+def render_version(dcts):
+    """Версия текстов: исходники композера, глифы и сам render_for_ics."""
+    h = hashlib.sha1(open(__file__, 'rb').read())
+    h.update(repr((render_cache.COMPOSER_VERSION if dcts else None, GL_B, GL_A, CFG.get('glyphs'))).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+def _compose_desc(ev, composer, dcts):
+    desc = ''
+    if composer and dcts and ev.get('transit') and ev.get('aspect') and ev.get('target'):
+        desc = make_description_with_composer(ev, composer, dcts)
+    if not desc:
+        desc = make_description_with_composer(ev, None, None)
+    return _normalize_desc(desc)
+
+# --jobs: описания (композер + _normalize_desc) — в пуле процессов; композер и
+# словари грузятся один раз на воркер, порядок результатов — как у входа
+_W = {}
+def _init_worker():
+    _W['composer'] = load_composer(); _W['dcts'] = load_dicts(_W['composer'])
+
+def _compose_worker(ev):
+    return _compose_desc(ev, _W['composer'], _W['dcts'])
+
+PAR_MIN = 200   # меньше промахов — пул не окупает запуск
+
+def compose_descs(evs, composer, dcts, dc, ver, jobs=1):
+    """Описания для событий без своего description: попадания из DescCache,
+    промахи (уникальные по ключу) — последовательно или в jobs процессах."""
+    keys = [dc.key(ver, *_desc_inputs(ev)) for ev in evs]
+    out = [dc.peek(k) for k in keys]
+    todo = {}
+    for i, (k, v) in enumerate(zip(keys, out)):
+        if v is None: todo.setdefault(k, i)
+    idx = list(todo.values())
+    if jobs > 1 and len(idx) >= PAR_MIN:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as ex:
+            made = list(ex.map(_compose_worker, [evs[i] for i in idx], chunksize=max(1, len(idx) // (jobs * 8))))
+    else:
+        made = [_compose_desc(evs[i], composer, dcts) for i in idx]
+    for i, v in zip(idx, made): dc.put(keys[i], v)
+    dc.hits += sum(v is None for v in out) - len(idx)   # повторы ключа внутри прогона
+    got = dict(zip((keys[i] for i in idx), made))
+    return [v if v is not None else got[k] for k, v in zip(keys, out)]
+
+def render_events(events, jobs=1):
+    """Сырые события transits_slow -> события для ICS/push (в памяти, без файлов).
+    jobs > 1 — описания в пуле процессов; склейка осей остаётся последовательной."""
+    composer = load_composer()
+    dcts = load_dicts(composer)
+    dc = render_cache.DescCache(); ver = render_version(dcts)
     # Склейка осей до рендера
     events = axis_unify_events(events, composer, dcts)
     events = [normalize_axis_event(e) for e in events]
-    out = {'events': []}
+    bare = [ev for ev in events if not ev.get('description')]
+    descs = iter(compose_descs(bare, composer, dcts, dc, ver, jobs))
+    out = []
     for ev in events:
         # Корректируем дом транзита по аспекту (если нужно)
         # pass  # adjust_houses_for_aspect disabled for natal pipeline  # disabled for natal pipeline
@@ -438,20 +473,21 @@ def transform(in_path, out_path):
                 new_ev['summary'] = s2 if s2 else f"☽ {lab}"
         else:
             new_ev['summary'] = make_glyph_summary(ev) or ev.get('summary') or 'Event'
-        desc = ev.get('description') or ''
-        if (not desc) and composer and dcts and ev.get('transit') and ev.get('aspect') and ev.get('target'):
-            desc = make_description_with_composer(ev, composer, dcts)
-        if not desc:
-            desc = make_description_with_composer(ev, None, None)
-        new_ev['description'] = _normalize_desc(desc)
+        if ev.get('description'):
+            new_ev['description'] = _normalize_desc(ev['description'])
+        else:
+            new_ev['description'] = next(descs)
         new_ev['gd_id'] = ev.get('gd_id') or stable_id({**ev, **new_ev})
-        out['events'].append(new_ev)
-    with open(os.path.expanduser(out_path), 'w', encoding='utf-8') as f:
-        json.dump(out, f, ensure_ascii=False, indent=2)
-    print(f"OK: wrote {len(out['events'])} events -> {out_path}")
+        out.append(new_ev)
+    dc.save()
+    print(f"[render] events={len(out)} {dc.summary()}")
+    return out
 
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        print("Usage: python render_for_ics.py IN.json OUT.json")
-        sys.exit(1)
-    transform(sys.argv[1], sys.argv[2])
+    import argparse
+    ap = argparse.ArgumentParser(description="Render transits_slow events for ICS/push")
+    ap.add_argument('src', metavar='IN.json'); ap.add_argument('dst', metavar='OUT.json')
+    ap.add_argument('--jobs', '-j', type=int, default=int(os.environ.get('GEODAC_RENDER_JOBS', 1)),
+                    help='Processes for description composition (0 = all CPUs)')
+    args = ap.parse_args()
+    transform(args.src, args.dst, args.jobs or os.cpu_count() or 1)
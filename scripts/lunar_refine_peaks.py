@@ -4,6 +4,8 @@ from datetime import datetime,timedelta,timezone
 try: import yaml
 except: yaml=None
 import swisseph as swe
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ephem_cache
 
 ASPECTS=[('☌',0),('✶',60),('□',90),('△',120),('☍',180)]
 CLAMP_DEG=30.0      # бракет должен быть ближе к аспекту, чем 30°
@@ -15,7 +17,8 @@ try:
 except: TZ=timezone.utc
 
 def diff180(x): return (x+180.0)%360.0-180.0
-def moon_lon(jd): return swe.calc_ut(jd, swe.MOON)[0][0]
+_PC=ephem_cache.open_cache()   # таблицы + LRU: соседние интервалы bisect делят границы
+def moon_lon(jd): return _PC.lon(jd, swe.MOON)
 
 def has_root(a,b,target_deg):
   fa=diff180(moon_lon(a)-target_deg)
@@ -110,6 +113,7 @@ def main():
                     "summary":summ,"description":summ})
   out=items+add
   print(f"[refine] added={len(add)} total={len(out)}")
+  print(_PC.summary())
   json.dump(out, open("lunar_natal_for_ics.refined.json","w"), ensure_ascii=False, indent=2)
   print("written: lunar_natal_for_ics.refined.json")
 if __name__=="__main__": main()
@@ -6,7 +6,7 @@ ORIGIN_URL="${1:-$(cat "$HOME/astro/.state/remote.origin.url" 2>/dev/null || ech
 mkdir -p "$CLEAN"
 rsync -a --delete \
   --exclude='.git' \
-  --exclude='.gcal' --exclude='.state' \
+  --exclude='.gcal' --exclude='.state' --exclude='.cache' \
   --exclude='logs'  --exclude='backups' --exclude='chatlog' \
   --exclude='__pycache__' --exclude='*.pyc' --exclude='*.pyo' --exclude='*.pyd' \
   --exclude='*.bak.*' \
@@ -19,6 +19,7 @@ rsync -a --delete \
 cat > "$CLEAN/.gitignore" <<'EOF'
 .gcal/
 .state/
+.cache/
 logs/
 backups/
 chatlog/
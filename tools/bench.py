@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Бенчмарки горячих путей GeoDAC: transits/refine, лунный bisect, рендер, склейка осей, push.
+#
+# Каждый кейс запускается в отдельном процессе (честный peak RSS), на фиксированных
+# входах: натал из NATAL_LOCAL (без ~/astro/.state), синтетические события с seed,
+# свежий кэш эфемеридных таблиц. Без Swiss-файлов считаем на встроенном Moshier.
+# Результаты дописываются в историю (JSONL) и сравниваются с прошлым прогоном.
+#
+#   tools/bench.py                 # все кейсы, сравнение с историей
+#   tools/bench.py -k transits     # только кейсы с подстрокой в имени
+#   tools/bench.py --fail-on-regress 25
+import os, sys, json, time, random, argparse, subprocess, tempfile, resource, platform
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, 'scripts'))
+
+HISTORY = os.path.expanduser('~/astro/logs/bench_history.jsonl')
+SEED = 20250901
+
+CASES = {}
+def case(name):
+    def deco(fn):
+        CASES[name] = fn
+        return fn
+    return deco
+
+# --- счётчики эфемерид ---
+CALLS = {'calc_ut': 0, 'houses_ex': 0}
+
+def _count_swe():
+    import swisseph as swe
+    orig_calc, orig_houses = swe.calc_ut, swe.houses_ex
+    def calc_ut(*a, **kw):
+        CALLS['calc_ut'] += 1
+        return orig_calc(*a, **kw)
+    def houses_ex(*a, **kw):
+        CALLS['houses_ex'] += 1
+        return orig_houses(*a, **kw)
+    swe.calc_ut, swe.houses_ex = calc_ut, houses_ex
+
+def _transits():
+    import swisseph as swe
+    import transits_slow as ts
+    # фиксированный натал: без активной рамки из ~/astro/.state
+    ts.load_active_frame = lambda *a, **kw: (None, {})
+    if not os.path.isdir(ts.EPHE):
+        ts.FLAGS = swe.FLG_MOSEPH | swe.FLG_SPEED
+    return ts
+
+def _warm_tables(ts, jd0, jd1, names):
+    # таблицы строим до замера — кейсы меряют lookup, а не сборку
+    import ephem_table
+    et = ephem_table.open_tables(ts.EPHE, ts.FLAGS)
+    if et is not None:
+        et.prebuild(jd0, jd1, [ts.BODIES[n] for n in names])
+
+# --- синтетические входы ---
+AXES = ('ASC', 'DSC', 'MC', 'IC')
+PLANETS = ('Sun', 'Moon', 'Mercury', 'Venus', 'Mars', 'Jupiter', 'Saturn')
+SIGNS = ('ARIES', 'TAURUS', 'GEMINI', 'CANCER', 'LEO', 'VIRGO', 'LIBRA', 'SCORPIO',
+         'SAGITTARIUS', 'CAPRICORN', 'AQUARIUS', 'PISCES')
+
+def synth_raw_events(n, seed=SEED):
+    """Сырые события формата transits_slow (Луна по наталу, ~40% — к осям)."""
+    rnd = random.Random(seed)
+    t = datetime(2025, 1, 1)
+    out = []
+    for _ in range(n):
+        t += timedelta(minutes=rnd.randint(5, 180))
+        dur = timedelta(minutes=rnd.randint(60, 300))
+        tgt = rnd.choice(AXES) if rnd.random() < 0.4 else rnd.choice(PLANETS)
+        out.append({
+            'transit': 'Moon', 'target': tgt, 'aspect': rnd.choice('☌✶□△☍'), 'aspect_deg': 0,
+            'orb_peak_deg': 0.0,
+            'houses': {'tr': rnd.randint(1, 12), 'nat': rnd.randint(1, 12)},
+            'signs': {'tr': rnd.choice(SIGNS), 'nat': rnd.choice(SIGNS)},
+            'start': t.strftime('%Y-%m-%d %H:%M'),
+            'peak': (t + dur/2).strftime('%Y-%m-%d %H:%M'),
+            'end': (t + dur).strftime('%Y-%m-%d %H:%M'),
+        })
+    return out
+
+def _render():
+    import render_for_ics as rfi
+    # без внешнего композера и пользовательских глифов — вход фиксирован
+    rfi.load_composer = lambda *a, **kw: None
+    rfi.CFG, rfi.GL_B, rfi.GL_A = {}, {}, {}
+    return rfi
+
+def _tmpjson(obj):
+    fd, path = tempfile.mkstemp(suffix='.json', prefix='bench_')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False)
+    return path
+
+# --- кейсы: prepare -> (run, info) ---
+@case('transits_moon_28d')
+def _():
+    ts = _transits()
+    t0 = ts.TZ.localize(datetime(2025, 9, 1)); t1 = ts.TZ.localize(datetime(2025, 9, 28, 23, 59))
+    _warm_tables(ts, ts.jd_utc(t0) - 2, ts.jd_utc(t1) + 2, ['Moon'])
+    return lambda: {'events': len(ts.compute(t0, t1, ['Moon'])['events'])}
+
+@case('transits_outer_1y')
+def _():
+    ts = _transits()
+    names = ['Jupiter', 'Saturn', 'Uranus', 'Neptune', 'Pluto']
+    t0 = ts.TZ.localize(datetime(2025, 1, 1)); t1 = ts.TZ.localize(datetime(2025, 12, 31, 23, 59))
+    _warm_tables(ts, ts.jd_utc(t0) - 12, ts.jd_utc(t1) + 12, names)
+    return lambda: {'events': len(ts.compute(t0, t1, names)['events'])}
+
+@case('refine_peak')
+def _():
+    import swisseph as swe
+    ts = _transits()
+    jd0 = swe.julday(2025, 9, 1, 0.0)
+    _warm_tables(ts, jd0 - 2, jd0 + 32, ['Moon', 'Mercury'])
+    ts.open_ephem(ts.EPHE)
+    jobs = []
+    for i in range(200):
+        jd = jd0 + i*0.15
+        pid = swe.MOON if i % 2 == 0 else swe.MERCURY
+        lon, _ = ts.lon_planet(jd, pid)
+        jobs.append((pid, (lon + 0.3) % 360.0, jd))
+    def run():
+        for pid, ref, jd in jobs:
+            ts.refine_peak(pid, ref, jd)
+        return {'peaks': len(jobs)}
+    return run
+
+@case('lunar_bisect_28d')
+def _():
+    import swisseph as swe
+    import yaml
+    import lunar_refine_peaks as lrp
+    nat = yaml.safe_load(open(os.path.join(ROOT, 'config', 'natal_positions.yaml'), encoding='utf-8'))
+    pts = [float(v) for v in nat.values() if isinstance(v, (int, float))]
+    dt0 = datetime(2025, 9, 1); dt1 = dt0 + timedelta(days=28)
+    if lrp._PC.et is not None:
+        lrp._PC.et.prebuild(swe.julday(2025, 8, 30, 0.0), swe.julday(2025, 10, 1, 0.0), [swe.MOON])
+    def run():
+        roots = 0
+        for lon in pts:
+            for _sym, deg in lrp.ASPECTS:
+                for a, b in lrp.jd_range(dt0, dt1, 3):
+                    if lrp.bisect(a, b, (lon + deg) % 360.0) is not None: roots += 1
+        return {'roots': roots}
+    return run
+
+@case('render_transform_10k')
+def _():
+    rfi = _render()
+    src = _tmpjson({'events': synth_raw_events(10000)})
+    dst = src.replace('.json', '.out.json')
+    def run():
+        rfi.transform(src, dst)
+        return {'events': len(json.load(open(dst, encoding='utf-8'))['events'])}
+    return run
+
+@case('axis_unify_10k')
+def _():
+    rfi = _render()
+    evs = synth_raw_events(10000)
+    return lambda: {'events': len(rfi.axis_unify_events([dict(e) for e in evs]))}
+
+@case('merge_axes_10k')
+def _():
+    rfi = _render()
+    import lunar_merge_angles as lma
+    src = _tmpjson({'events': synth_raw_events(10000)})
+    fix = src.replace('.json', '.fix.json'); dst = src.replace('.json', '.merged.json')
+    rfi.transform(src, fix)
+    def run():
+        lma.merge_axes(fix, dst)
+        return {'events': len(json.load(open(dst, encoding='utf-8'))['events'])}
+    return run
+
+def _push(n, argv_extra, **fake_kw):
+    """push_gcal.main дважды (вставки, затем обновления) в gcal_backends.FakeCalendar."""
+    try:
+        import push_gcal, gcal_backends
+    except ImportError as e:
+        return {'skip': f"push_gcal deps missing: {e}"}
+    fake = gcal_backends.FakeCalendar(**fake_kw)
+    push_gcal.open_backend = lambda *a, **kw: fake
+    evs = synth_raw_events(n)
+    for e in evs: e['summary'] = f"☽ {e['aspect']} {e['target']}"
+    src = _tmpjson({'events': evs})
+    argv = ['push_gcal.py', '--json', src, '--calendar', 'Bench', '--replace', '--no-mirror', '--rate', '0'] + argv_extra
+    def run():
+        old = sys.argv; sys.argv = argv
+        out = sys.stdout; sys.stdout = open(os.devnull, 'w')
+        try:
+            push_gcal.main(); push_gcal.main()   # первый — вставки, второй — обновления
+        finally:
+            sys.stdout.close(); sys.stdout = out; sys.argv = old
+        return {'events': sum(len(c['events']) for c in fake.cals.values()), 'http': fake.calls}
+    return run
+
+@case('push_gcal_fake_2k')
+def _():
+    return _push(2000, [])
+
+@case('push_gcal_fake_50k_latency')
+def _():
+    # 50k событий, 20 мс на HTTP-запрос, 4 потока: стоимость сети против пула/batch
+    return _push(50000, ['--workers', '4'], latency=0.02, seed=SEED)
+
+@case('gcal_restore_legacy_2k')
+def _():
+    # restore снимка из тел без gd_hash (записаны до хэшей, скачаны первым --backup):
+    # local-бэкенд, затем push --backup другого JSON и restore первого снимка
+    try:
+        import push_gcal, gcal_backends, gcal_backup
+    except ImportError as e:
+        return {'skip': f"push_gcal deps missing: {e}"}
+    root = tempfile.mkdtemp(prefix='bench_gcal_')
+    svc = gcal_backends.LocalCalendar(root)
+    push_gcal.open_backend = lambda *a, **kw: svc
+    evs = synth_raw_events(2000)
+    for e in evs: e['summary'] = f"☽ {e['aspect']} {e['target']}"
+    cal_id = push_gcal.get_or_create_calendar(svc, 'Bench', 'Europe/Moscow')
+    legacy = push_gcal.desired_bodies(evs, 'Europe/Moscow')
+    for b in legacy.values():
+        b['extendedProperties']['private'].pop('gd_hash')
+        svc.events().insert(calendarId=cal_id, body=b).execute()
+    for e in evs: e['summary'] += ' *'
+    src = _tmpjson({'events': evs})
+    def main(mod, argv):
+        old = sys.argv; sys.argv = argv
+        out = sys.stdout; sys.stdout = open(os.devnull, 'w')
+        try: return mod.main()
+        finally: sys.stdout.close(); sys.stdout = out; sys.argv = old
+    main(push_gcal, ['push_gcal.py', '--json', src, '--calendar', 'Bench', '--replace', '--backup', '--rate', '0'])
+    first = push_gcal.backend_backup(svc, 'Bench').snapshots()[0]
+    def run():
+        rc = main(gcal_backup, ['gcal_backup.py', 'restore', first, '--calendar', 'Bench', '--rate', '0'])
+        got = {(b['extendedProperties']['private']['gd_id'], b['summary']) for b in svc._events(cal_id).values()}
+        if rc or got != {(k, b['summary']) for k, b in legacy.items()}:
+            raise SystemExit(f"restore mismatch: rc={rc}, events={len(got)}")
+        return {'events': len(got), 'http': svc.calls}
+    return run
+
+@case('gcal_window_edge')
+def _():
+    # prune и --replace-scope window по наивным местным временам (тела to_dt_local, fake):
+    # события в 2 ч по обе стороны границы (UTC), зона календаря UTC+3
+    try:
+        import push_gcal, gcal_backends
+    except ImportError as e:
+        return {'skip': f"push_gcal deps missing: {e}"}
+    from datetime import timezone
+    from zoneinfo import ZoneInfo
+    tz = 'Europe/Moscow'
+    svc = gcal_backends.FakeCalendar()
+    push_gcal.open_backend = lambda *a, **kw: svc
+    cal_id = push_gcal.get_or_create_calendar(svc, 'Bench', tz)
+    evs = synth_raw_events(50)
+    t = datetime.now() + timedelta(days=30)
+    for i, e in enumerate(evs):
+        e['summary'] = f"☽ {e['target']}"
+        e['start'] = (t + timedelta(hours=i)).strftime('%Y-%m-%d %H:%M')
+        e['end'] = (t + timedelta(hours=i + 1)).strftime('%Y-%m-%d %H:%M')
+    w0, _w1 = push_gcal.desired_window(push_gcal.desired_bodies(evs, tz), tz)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=1)
+    def put(gd, at):
+        loc = at.astimezone(ZoneInfo(tz)).replace(tzinfo=None).isoformat(timespec='seconds')
+        svc.events().insert(calendarId=cal_id, body={
+            'summary': gd, 'start': {'dateTime': loc, 'timeZone': tz}, 'end': {'dateTime': loc, 'timeZone': tz},
+            'extendedProperties': {'private': {'src': 'geodac', 'gd_id': gd, 'gd_hash': gd}}}).execute()
+    h2 = timedelta(hours=2)
+    put('prune', cutoff - h2); put('keep-prune', cutoff + h2)
+    put('keep-window', w0 - h2); put('replace', w0 + h2)
+    src = _tmpjson({'events': evs})
+    argv = ['push_gcal.py', '--json', src, '--calendar', 'Bench', '--tz', tz, '--replace', '--replace-scope', 'window',
+            '--prune-before-days', '1', '--rate', '0']
+    def run():
+        old = sys.argv; sys.argv = argv
+        out = sys.stdout; sys.stdout = open(os.devnull, 'w')
+        try: push_gcal.main()
+        finally: sys.stdout.close(); sys.stdout = out; sys.argv = old
+        left = sorted(e['summary'] for e in svc._events(cal_id).values() if not e['summary'].startswith('☽'))
+        if left != ['keep-prune', 'keep-window']:
+            raise SystemExit(f"window edge: left {left}, expected ['keep-prune', 'keep-window']")
+        return {'events': len(svc._events(cal_id))}
+    return run
+
+# --- раннер ---
+def run_case(name):
+    """Выполняется в дочернем процессе: подготовка, затем замер одного прогона."""
+    os.environ.setdefault('GEODAC_EPHEM_DIR', tempfile.mkdtemp(prefix='bench_ephem_'))
+    os.environ.setdefault('GEODAC_RENDER_CACHE', tempfile.mkdtemp(prefix='bench_render_'))   # холодный кэш описаний
+    _count_swe()
+    prep = CASES[name]()
+    if isinstance(prep, dict):
+        return dict(prep, case=name)
+    CALLS['calc_ut'] = CALLS['houses_ex'] = 0
+    t = time.perf_counter()
+    info = prep() or {}
+    wall = time.perf_counter() - t
+    return {'case': name, 'wall_s': round(wall, 4), 'calc_ut': CALLS['calc_ut'],
+            'houses_ex': CALLS['houses_ex'],
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0, 1),
+            'info': info}
+
+def last_results(path):
+    prev = {}
+    if os.path.exists(path):
+        for line in open(path, encoding='utf-8'):
+            try: rec = json.loads(line)
+            except Exception: continue
+            for r in rec.get('results', []): prev[r['case']] = r
+    return prev
+
+def main():
+    ap = argparse.ArgumentParser(description="GeoDAC hot-path benchmarks")
+    ap.add_argument('-k', default='', help='Run only cases whose name contains this substring')
+    ap.add_argument('--history', default=HISTORY, help='JSONL history file')
+    ap.add_argument('--no-save', action='store_true', help='Do not append this run to the history')
+    ap.add_argument('--fail-on-regress', type=float, default=0.0, metavar='PCT',
+                    help='Exit 1 if any wall time regresses by more than PCT percent')
+    ap.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case), ensure_ascii=False))
+        return
+
+    prev = last_results(args.history)
+    results = []; regress = []
+    print(f"{'case':24} {'wall s':>9} {'Δ%':>7} {'calc_ut':>9} {'houses':>7} {'RSS MB':>8}  info")
+    for name in CASES:
+        if args.k not in name: continue
+        p = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', name],
+                           capture_output=True, text=True)
+        if p.returncode != 0:
+            print(f"{name:24} FAILED\n{p.stderr.strip()[-800:]}")
+            results.append({'case': name, 'error': p.stderr.strip()[-800:]}); continue
+        r = json.loads(p.stdout.strip().splitlines()[-1])
+        results.append(r)
+        if 'skip' in r:
+            print(f"{name:24} skipped: {r['skip']}"); continue
+        old = prev.get(name, {}).get('wall_s')
+        delta = (r['wall_s']/old - 1.0)*100.0 if old else None
+        if delta is not None and args.fail_on_regress and delta > args.fail_on_regress:
+            regress.append(name)
+        print(f"{name:24} {r['wall_s']:9.3f} {('%+.1f' % delta) if delta is not None else '-':>7} "
+              f"{r['calc_ut']:9d} {r['houses_ex']:7d} {r['peak_rss_mb']:8.1f}  {json.dumps(r['info'], ensure_ascii=False)}")
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        rec = {'ts': datetime.now().isoformat(timespec='seconds'), 'host': platform.node(),
+               'python': platform.python_version(), 'results': results}
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+    if regress:
+        print(f"REGRESSION (> {args.fail_on_regress}%): {', '.join(regress)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
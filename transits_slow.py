@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
-import os
-import swisseph as swe, pytz, datetime as dt, math, json, argparse
+import os, sys, re, time, hashlib
+import swisseph as swe, pytz, datetime as dt, math, json, argparse, heapq, bisect
 
 import json as _json
+import ephem_table, ephem_cache
+
+try:
+    import numpy as np
+except Exception:
+    np = None
 
 def rotate_cusps(cusps, asc=None):
     if not cusps or asc is None: 
@@ -18,19 +24,21 @@ def rotate_cusps(cusps, asc=None):
 def load_active_frame(path=os.path.expanduser('~/astro/.state/natal_frame.json')):
     try:
         d = _json.load(open(path, 'r', encoding='utf-8'))
-        cusps = d.get('cusps') or []
-        # формат: [None, cusp1..cusp12] — выкидываем None и приводим к float
-        cleaned=[]
-        for x in cusps:
-            if x is None: continue
-            try: cleaned.append(float(x)%360.0)
-            except: pass
-        if len(cleaned)>12: cleaned=cleaned[-12:]
         axes = d.get('axes') or {}
-        return cleaned if len(cleaned)==12 else None, axes
+        return clean_cusps(d.get('cusps')), axes
     except Exception:
         return None, {}
 
+def clean_cusps(cusps):
+    # формат: [None, cusp1..cusp12] — выкидываем None и приводим к float
+    cleaned=[]
+    for x in cusps or []:
+        if x is None: continue
+        try: cleaned.append(float(x)%360.0)
+        except: pass
+    if len(cleaned)>12: cleaned=cleaned[-12:]
+    return cleaned if len(cleaned)==12 else None
+
 # --- конфиг по умолчанию ---
 EPHE = "/home/DAC/Zet9 GeoDAC/Swiss"   # путь к эфемеридам ZET9 (с пробелом — в кавычках)
 TZ    = pytz.timezone("Europe/Moscow") # UTC+3
@@ -58,12 +66,110 @@ def jd_utc(dt_local):
     ut = dt_local.astimezone(pytz.utc)
     return swe.julday(ut.year, ut.month, ut.day, ut.hour + ut.minute/60 + ut.second/3600.0)
 
+FLAGS = swe.FLG_SWIEPH | swe.FLG_SPEED
+_ET = None  # ephem_table.EphemTables — подключается в compute() (GEODAC_EPHEM_TABLE=0 — выключить)
+_PC = None  # ephem_cache.PositionCache поверх _ET/calc_ut (GEODAC_EPHEM_CACHE=0 — выключить)
+
+def open_ephem(ephe):
+    """Таблицы и LRU-кэш позиций для ephe/FLAGS (в каждом процессе скана)."""
+    global _ET, _PC
+    _ET = ephem_table.open_tables(ephe, FLAGS)
+    _PC = ephem_cache.open_cache(ephe, FLAGS)
+
+# --- профилирование (--profile / GEODAC_PROFILE=1) ---
+PROF = None          # Profile, когда включено
+SCAN_HOOK = None     # фабрика контекст-менеджера вокруг цикла скана (--profile-hook MOD:FUNC)
+PID_NAMES = {pid: nm for nm, pid in BODIES.items()}
+
+class Profile:
+    """Счётчики по фазам (natal/scan/refine/other) и телам: реальные вызовы
+    swe.calc_ut/houses_ex (включая сборку ephem_table), lookups lon_planet
+    (из таблиц или calc_ut), время фаз и окна opened/closed по телам."""
+    def __init__(self):
+        self.phase = 'other'; self.t = self.t0 = time.perf_counter()
+        self.time = {}; self.calls = {}; self.windows = {}
+
+    def switch(self, phase):
+        now = time.perf_counter()
+        self.time[self.phase] = self.time.get(self.phase, 0.0) + now - self.t
+        prev, self.phase, self.t = self.phase, phase, now
+        return prev
+
+    def count(self, kind, body):
+        c = self.calls.setdefault(self.phase, {}).setdefault(kind, {})
+        c[body] = c.get(body, 0) + 1
+
+    def window(self, pname, what):
+        w = self.windows.setdefault(pname, {"opened": 0, "closed": 0})
+        w[what] += 1
+
+    def report(self):
+        self.switch(self.phase)
+        phases = {}
+        for ph in sorted(set(self.time) | set(self.calls)):
+            d = {"time_s": round(self.time.get(ph, 0.0), 4)}
+            for kind, per in sorted(self.calls.get(ph, {}).items()):
+                d[kind] = dict(sorted(per.items()), total=sum(per.values()))
+            phases[ph] = d
+        return {"wall_s": round(time.perf_counter() - self.t0, 4), "ephem_table": _ET is not None,
+                "cache": _PC.stats() if _PC is not None else None,
+                "phases": phases, "windows": dict(sorted(self.windows.items()))}
+
+    def merge(self, rep):
+        """Добавить отчёт рабочего процесса (шарды --workers)."""
+        for ph, d in rep["phases"].items():
+            self.time[ph] = self.time.get(ph, 0.0) + d["time_s"]
+            for kind, per in d.items():
+                if kind == "time_s": continue
+                c = self.calls.setdefault(ph, {}).setdefault(kind, {})
+                for body, n in per.items():
+                    if body != "total": c[body] = c.get(body, 0) + n
+        for pname, w in rep["windows"].items():
+            for what, n in w.items():
+                self.windows.setdefault(pname, {"opened": 0, "closed": 0})[what] += n
+
+def enable_profile():
+    """Включить счётчики: обёртки над swe.calc_ut/houses_ex (один раз на процесс)."""
+    global PROF
+    PROF = Profile()
+    if getattr(swe.calc_ut, '_geodac_prof', False): return PROF
+    calc_ut, houses_ex = swe.calc_ut, swe.houses_ex
+    def counted_calc_ut(jd, pid, *a, **kw):
+        if PROF is not None: PROF.count("calc_ut", PID_NAMES.get(pid, str(pid)))
+        return calc_ut(jd, pid, *a, **kw)
+    def counted_houses_ex(*a, **kw):
+        if PROF is not None: PROF.count("houses_ex", "houses")
+        return houses_ex(*a, **kw)
+    counted_calc_ut._geodac_prof = True
+    swe.calc_ut, swe.houses_ex = counted_calc_ut, counted_houses_ex
+    return PROF
+
+def load_hook(spec):
+    """MOD:FUNC -> FUNC(); FUNC() должна вернуть контекст-менеджер (напр. семплирующий профайлер)."""
+    import importlib
+    mod, _, fn = spec.partition(':')
+    return getattr(importlib.import_module(mod), fn or 'profile_hook')
+
 def lon_planet(jd_ut, pid):
-    pos,_ = swe.calc_ut(jd_ut, pid, swe.FLG_SWIEPH | swe.FLG_SPEED)
+    if PROF is not None: PROF.count("lookup", PID_NAMES.get(pid, str(pid)))
+    if _PC is not None:
+        return _PC.lon_speed(jd_ut, pid)
+    if _ET is not None:
+        return _ET.lon_speed(jd_ut, pid)
+    pos,_ = swe.calc_ut(jd_ut, pid, FLAGS)
     return norm(pos[0]), pos[3]  # lon, speed deg/day
 
-def houses(jd_ut):
-    cusps, ascmc = swe.houses_ex(jd_ut, LAT, LON, b'T')
+def lon_many(jds, pid):
+    """Долготы тела на массиве моментов (numpy): из таблиц или поштучно через calc_ut."""
+    if PROF is not None:
+        c = PROF.calls.setdefault(PROF.phase, {}).setdefault("lookup", {})
+        c[PID_NAMES.get(pid, str(pid))] = c.get(PID_NAMES.get(pid, str(pid)), 0) + len(jds)
+    if _ET is not None:
+        return _ET.lon_speed_many(jds, pid)[0]
+    return np.array([swe.calc_ut(jd, pid, FLAGS)[0][0] for jd in jds]) % 360.0
+
+def houses(jd_ut, lat=None, lon=None):
+    cusps, ascmc = swe.houses_ex(jd_ut, LAT if lat is None else lat, LON if lon is None else lon, b'T')
     return [c % 360.0 for c in cusps[:12]], ascmc
 
 def house_of(lon, cusps):
@@ -88,27 +194,82 @@ def orb_v11(transit_name, target_kind, asp_deg):
     if target_kind == "angle": base += 0.5
     return base
 
-def refine_peak(pid, ref_angle_abs, jd_guess):
-    # уточняем пик (мин. орб к ref_angle_abs) шагами 60-10-2-0.5 мин
-    best=(1e9, jd_guess)
-    span_h=24
-    jd0 = jd_guess - span_h/24.0
-    jd1 = jd_guess + span_h/24.0
-    for step in (60,10,2,0.5):
-        N = int((jd1-jd0)*24*60/step)+1
-        for k in range(max(2,N)):
-            jd = jd0 + k*step/1440.0
-            lon_tr,_ = lon_planet(jd, pid)
-            orb = abs(angdiff(lon_tr, ref_angle_abs))
-            if orb < best[0]:
-                best = (orb, jd)
-        jd0, jd1 = best[1] - step/24.0, best[1] + step/24.0
-    return best  # (orb_abs_deg, jd_peak)
-
-def compute(start_local, end_local, transiting_names):
-    swe.set_ephe_path(EPHE)
+PEAK_TOL_JD = 1.0/86400  # точность пика: 1 секунда
+
+def refine_peak(pid, ref_angle_abs, jd_guess, span_h=24):
+    """Точный момент аспекта: корень f(jd)=angdiff(lon, ref) в ±span_h от догадки.
+    Ньютон по скорости из FLG_SPEED с откатом на бисекцию внутри бракета;
+    если смены знака нет (стояние/касание орба) — поиск минимума |f|.
+    Возвращает (orb_abs_deg, jd_peak, lon_peak)."""
+    def f(jd):
+        lon, spd = lon_planet(jd, pid)
+        return angdiff(lon, ref_angle_abs), spd, lon
+    a = jd_guess - span_h/24.0
+    b = jd_guess + span_h/24.0
+
+    # 1) Ньютон от догадки — обычно 3–5 вызовов
+    fg, vg, lg = f(jd_guess)
+    x, fx, vx, lx = jd_guess, fg, vg, lg
+    for _ in range(8):
+        if fx == 0.0: return 0.0, x, lx
+        if vx == 0.0: break
+        xn = x - fx/vx
+        if not (a <= xn <= b): break
+        dx = abs(xn - x)
+        x = xn; fx, vx, lx = f(x)
+        if dx < PEAK_TOL_JD: return abs(fx), x, lx
+
+    # 2) бракет со сменой знака рядом с догадкой → Ньютон с откатом на бисекцию
+    for end in (a, b):
+        fe = f(end)[0]
+        if fe*fg > 0: continue
+        lo, hi = (jd_guess, end) if fg < 0 else (end, jd_guess)   # f(lo) <= 0 <= f(hi)
+        x = 0.5*(lo + hi)
+        for _ in range(60):
+            fx, vx, lx = f(x)
+            if fx == 0.0: break
+            if fx < 0: lo = x
+            else: hi = x
+            xn = x - fx/vx if vx else None
+            if xn is None or not (min(lo,hi) < xn < max(lo,hi)):
+                xn = 0.5*(lo + hi)
+            if abs(xn - x) < PEAK_TOL_JD: break
+            x = xn
+        return abs(fx), x, lx
+
+    # 3) корня нет: минимум |f| золотым сечением (стояние у точки аспекта)
+    gr = (math.sqrt(5.0) - 1.0)/2.0
+    lo, hi = a, b
+    c = hi - gr*(hi - lo); d = lo + gr*(hi - lo)
+    fc = f(c); fd = f(d)
+    while hi - lo > PEAK_TOL_JD*60:
+        if abs(fc[0]) < abs(fd[0]):
+            hi, d, fd = d, c, fc
+            c = hi - gr*(hi - lo); fc = f(c)
+        else:
+            lo, c, fc = c, d, fd
+            d = lo + gr*(hi - lo); fd = f(d)
+    x, r = (c, fc) if abs(fc[0]) < abs(fd[0]) else (d, fd)
+    if abs(fg) < abs(r[0]): x, r = jd_guess, (fg, vg, lg)
+    return abs(r[0]), x, r[2]
+
+TARGETS = ("Sun","Moon","Mercury","Venus","Mars","ASC","MC","DSC","IC")
+ANGLES  = ("ASC","MC","DSC","IC")
+TARGET_POINTS = None   # {имя: долгота} из natal_positions.yaml (--points); None — стандартные цели
 
-    # Натал: долготы личных и углы
+def natal_context(profile=None):
+    """Натал: долготы личных, углы, узлы, куспиды и дома целей.
+    profile — чарт из пакетного режима (birth/tz/lat/lon, опц. cusps/axes);
+    без него — NATAL_LOCAL, Москва и ~/astro/.state/natal_frame.json."""
+    if PROF is not None:
+        prev = PROF.switch("natal")
+        try: return _natal_context(profile)
+        finally: PROF.switch(prev)
+    return _natal_context(profile)
+
+def _natal_context(profile):
+    if profile is not None:
+        return profile_context(profile)
     jd_nat = jd_utc(NATAL_LOCAL)
     af = load_active_frame()
     af_cusps, af_axes = (af.get('cusps'), af.get('axes')) if isinstance(af, dict) else (af[0], af[1])
@@ -127,6 +288,28 @@ def compute(start_local, end_local, transiting_names):
         ascmc_nat = [af_axes.get('ASC', 0.0), af_axes.get('MC', 0.0)]
     else:
         cusps_nat, ascmc_nat = houses(jd_nat)
+    ctx = natal_points(jd_nat, cusps_nat, ascmc_nat)
+    if TARGET_POINTS:
+        apply_points(ctx, TARGET_POINTS)
+    return ctx
+
+def profile_context(profile):
+    tz = pytz.timezone(profile.get('tz') or TZ.zone)
+    birth = tz.localize(dt.datetime.fromisoformat(str(profile['birth']).replace(' ', 'T')))
+    jd_nat = jd_utc(birth)
+    cusps_nat = clean_cusps(profile.get('cusps'))
+    if cusps_nat:
+        axes = profile.get('axes') or {}
+        ascmc_nat = [axes.get('ASC', cusps_nat[0]), axes.get('MC', cusps_nat[9])]
+    else:
+        cusps_nat, ascmc_nat = houses(jd_nat, float(profile['lat']), float(profile['lon']))
+    ctx = natal_points(jd_nat, cusps_nat, ascmc_nat)
+    pts = profile.get('points')
+    if pts:
+        apply_points(ctx, load_points(pts) if isinstance(pts, str) else {k: norm(float(v)) for k, v in pts.items()})
+    return ctx
+
+def natal_points(jd_nat, cusps_nat, ascmc_nat):
     natal = {}
     for pid,name in [(swe.SUN,"Sun"),(swe.MOON,"Moon"),(swe.MERCURY,"Mercury"),
                      (swe.VENUS,"Venus"),(swe.MARS,"Mars")]:
@@ -144,100 +327,552 @@ def compute(start_local, end_local, transiting_names):
     nat_houses.update({"ASC":1,"MC":10,"DSC":7,"IC":4})
     nat_houses["NN"] = house_of(natal["NN"], cusps_nat)
     nat_houses["SN"] = house_of(natal["SN"], cusps_nat)
+    return {"natal": natal, "cusps": cusps_nat, "houses": nat_houses, "targets": TARGETS}
 
-    # Сканирование
-    t0, t1 = start_local, end_local
-    jd0, jd1 = jd_utc(t0), jd_utc(t1)
-    step_h = 1.0
-    results = []
-    # состояние: ключ (pname, target, deg, pol) -> окно
-    state = {}
+def load_points(path):
+    """Натальные точки из natal_positions.yaml: все числовые ключи верхнего уровня (houses — пропуск)."""
+    import yaml
+    d = yaml.safe_load(open(os.path.expanduser(path), 'r', encoding='utf-8')) or {}
+    return {str(k): norm(float(v)) for k, v in d.items() if isinstance(v, (int, float))}
 
-    transiting = [(BODIES[nm], nm) for nm in transiting_names]
+def apply_points(ctx, points):
+    """Цели сканера = точки из YAML (долготы из файла, дома — по куспидам рамки)."""
+    for name, lon in points.items():
+        ctx["natal"][name] = lon
+        ctx["houses"][name] = {"ASC":1,"MC":10,"DSC":7,"IC":4}.get(name) or house_of(lon, ctx["cusps"])
+    ctx["targets"] = tuple(points)
 
-    def open_win(pname, tgt, deg, pol, jd):
-        state[(pname,tgt,deg,pol)] = {"in":True, "deg":deg, "pol":pol, "jd_start":jd, "min_orb":999, "jd_min":jd}
-
-    def close_win(pid, pname, tgt, deg, pol, start_jd, end_jd, min_orb, jd_min, ref_abs):
-        orb_peak, jd_peak = refine_peak(pid, ref_abs, jd_min)
-        # дом транзита на пик
-        lon_tr,_ = lon_planet(jd_peak, pid)
-        tr_house = house_of(lon_tr, cusps_nat)
-        tr_sign = sign_of(lon_tr)
-        nat_sign = sign_of(natal[tgt])
-        to_dt = lambda jd: dt.datetime.fromtimestamp((jd-2440587.5)*86400,
+def aspect_refs(natal, targets=TARGETS):
+    """Все (target, kind, deg, pol, ref_abs) в порядке обхода сканера."""
+    refs = []
+    for tgt in targets:
+        lon_nat = natal[tgt]
+        kind = "angle" if tgt in ANGLES else "planet"
+        for deg, sym in ASPS:
+            # полярности: +deg и -deg (для 0 и 180 достаточно +1)
+            pols = (1,) if deg in (0,180) else (1,-1)
+            for pol in pols:
+                refs.append((tgt, kind, deg, pol, norm(lon_nat + pol*deg)))
+    return refs
+
+def jd_to_local(jd):
+    return dt.datetime.fromtimestamp((jd-2440587.5)*86400,
         tz=dt.timezone.utc).astimezone(TZ).strftime("%Y-%m-%d %H:%M")
-        results.append({
-            "transit": pname,
-            "target": tgt,
-            "aspect": next(sym for d,sym in ASPS if d==deg),
-            "aspect_deg": deg,
-            "orb_peak_deg": round(orb_peak,3),
-            "houses": {"tr": tr_house, "nat": nat_houses.get(tgt)},
-            "signs": {"tr": tr_sign, "nat": nat_sign},
-            "start": to_dt(start_jd),
-            "peak":  to_dt(jd_peak),
-            "end":   to_dt(end_jd)
-        })
 
-    jd = jd0
-    while jd <= jd1 + 1e-9:
-        # позиции транзитных
-        tr_lons = {}
-        for pid,pname in transiting:
-            lon,_ = lon_planet(jd, pid)
-            tr_lons[pname]=(pid,lon)
-        # цели
-        for tgt in ("Sun","Moon","Mercury","Venus","Mars","ASC","MC","DSC","IC"):
-            lon_nat = natal[tgt]
-            kind = "angle" if tgt in ("ASC","MC","DSC","IC") else "planet"
-            for deg, sym in ASPS:
-                # полярности: +deg и -deg (для 0 и 180 достаточно +1)
-                pols = (1,) if deg in (0,180) else (1,-1)
-                for pol in pols:
-                    ref_abs = norm(lon_nat + pol*deg)
-                    for pid,pname in transiting:
-                        plon = tr_lons[pname][1]
-                        orb_now = abs(angdiff(plon, ref_abs))
-                        lim = orb_v11(pname, kind, deg)
-                        key = (pname, tgt, deg, pol)
-                        st = state.get(key)
-                        inside = orb_now <= lim
-                        if inside:
-                            if not st or not st.get("in"):
-                                open_win(pname, tgt, deg, pol, jd)
-                                st = state[key]
-                                st["min_orb"] = orb_now; st["jd_min"] = jd
-                            else:
-                                if orb_now < st["min_orb"]:
-                                    st["min_orb"] = orb_now; st["jd_min"] = jd
-                        else:
-                            if st and st.get("in"):
-                                close_win(tr_lons[pname][0], pname, tgt, deg, pol,
-                                          st["jd_start"], jd, st["min_orb"], st["jd_min"], ref_abs)
-                                state[key] = {"in":False}
-        jd += step_h/24.0
+def make_event(ctx, pid, pname, tgt, deg, start_jd, end_jd, jd_min, ref_abs, span_h=24):
+    """Закрытое окно -> событие: уточнение пика, дом/знак транзита на пик."""
+    if PROF is not None:
+        prev = PROF.switch("refine")
+        orb_peak, jd_peak, lon_tr = refine_peak(pid, ref_abs, jd_min, span_h)
+        PROF.switch(prev)
+    else:
+        orb_peak, jd_peak, lon_tr = refine_peak(pid, ref_abs, jd_min, span_h)
+    # дом транзита на пик
+    tr_house = house_of(lon_tr, ctx["cusps"])
+    tr_sign = sign_of(lon_tr)
+    nat_sign = sign_of(ctx["natal"][tgt])
+    return {
+        "transit": pname,
+        "target": tgt,
+        "aspect": next(sym for d,sym in ASPS if d==deg),
+        "aspect_deg": deg,
+        "orb_peak_deg": round(orb_peak,3),
+        "houses": {"tr": tr_house, "nat": ctx["houses"].get(tgt)},
+        "signs": {"tr": tr_sign, "nat": nat_sign},
+        "start": jd_to_local(start_jd),
+        "peak":  jd_to_local(jd_peak),
+        "end":   jd_to_local(end_jd)
+    }
 
-    results.sort(key=lambda x: x["peak"])
-    meta = {
+def make_meta(t0, t1, transiting_names):
+    return {
         "tz": "UTC+3",
         "period": {"start": t0.strftime("%Y-%m-%d %H:%M"), "end": t1.strftime("%Y-%m-%d %H:%M")},
         "profile": "SE Topocentric; orbs v1.1; +0.5° to angles",
         "transiting": transiting_names,
-        "targets": "Sun,Moon,Mercury,Venus,Mars,ASC,MC,DSC,IC,NN,SN",
-        "majors": "☌ ☍ □ △ ✶"
+        "targets": ",".join(TARGET_POINTS) if TARGET_POINTS else "Sun,Moon,Mercury,Venus,Mars,ASC,MC,DSC,IC,NN,SN",
+        "majors": "☌ ☍ □ △ ✶",
+        **({"perf": PROF.report()} if PROF is not None else {})
     }
-    return {"meta": meta, "events": results}
+
+# Пределы движения (|скорость| град/сут, |ускорение| град/сут²), геоцентрические, по
+# максимумам 1950–2050: скорость — с запасом 3–8% (она ограничена физически, и
+# шаг дополнительно режется STEP_SAFETY), ускорение — ~2×. Луна: максимум ~15.4
+# в перигее — берём 16.5 (~7%); неизвестное тело — заведомо больше любого реального.
+MOTION_LIMITS = {
+    "Sun": (1.05, 0.002), "Moon": (16.5, 1.0), "Mercury": (2.3, 0.4), "Venus": (1.3, 0.1),
+    "Mars": (0.85, 0.03), "Jupiter": (0.25, 0.008), "Saturn": (0.14, 0.005),
+    "Uranus": (0.065, 0.005), "Neptune": (0.045, 0.005), "Pluto": (0.045, 0.002),
+    "NNode": (0.3, 0.12),
+}
+MOTION_DEFAULT = (30.0, 2.0)
+STEP_SAFETY = 0.8
+MAX_STEP_H = 240.0   # не дальше 10 суток — пик окна остаётся локализуемым
+
+def safe_steps(pname, speed, dist, step_h):
+    """Сколько шагов сетки тело гарантированно не пересечёт ни одной границы орба:
+    dist — расстояние (град) до ближайшей границы при текущей |speed|."""
+    vmax, amax = MOTION_LIMITS.get(pname, MOTION_DEFAULT)
+    v = abs(speed)
+    t = max(dist/vmax, (math.sqrt(v*v + 2.0*amax*dist) - v)/amax)  # сутки
+    n = int(t*24.0*STEP_SAFETY/step_h)
+    return max(1, min(n, int(MAX_STEP_H/step_h)))
+
+def time_grid(jd0, jd1, step_h=1.0):
+    """Часовая сетка сканирования (накоплением — минуты событий от этого зависят)."""
+    grid = []
+    jd = jd0
+    while jd <= jd1 + 1e-9:
+        grid.append(jd); jd += step_h/24.0
+    return grid
+
+def point_index(refs, pname):
+    """Кольцевой отсортированный индекс точек аспектов (ref_abs) для тела:
+    три копии круга (−360/0/+360), чтобы диапазон [lon−M, lon+M] брался одним bisect."""
+    lims = [orb_v11(pname, kind, deg) for _t, kind, deg, _p, _r in refs]
+    pts = sorted((ref % 360.0, r) for r, (_t, _k, _d, _p, ref) in enumerate(refs))
+    ring = [(x - 360.0, r) for x, r in pts] + pts + [(x + 360.0, r) for x, r in pts]
+    return [x for x, _ in ring], [r for _, r in ring], lims, max(lims, default=0.0)
+
+def scan(refs, grid, transiting, state, adaptive=True, step_h=1.0, k0=0):
+    """Генератор закрытых окон по сетке grid.
+
+    state — словарь окон (pname, target, deg, pol) -> {...}; после исчерпания
+    в нём остаются окна, открытые на последнем шаге. Каждое окно отдаётся как
+    dict с key/pid/ref/jd_start/jd_end/min_orb/jd_min/span_h и order —
+    (шаг, индекс ref, индекс тела), т.е. порядком закрытия при последовательном скане.
+    В адаптивном режиме каждое тело прыгает по сетке своим шагом, пока ни одна
+    граница орба не может быть пересечена — окна те же, что при шаге 1ч.
+    На каждом шаге проверяются только точки в пределах макс. орба тела (bisect
+    по point_index) и уже открытые окна — цена растёт с числом попаданий, а не целей.
+    С --profile время цикла идёт в фазу scan (потребитель между yield — в свою),
+    SCAN_HOOK() оборачивает весь цикл (семплирующий профайлер и т.п.)."""
+    hook = SCAN_HOOK() if SCAN_HOOK is not None else None
+    if hook is not None: hook.__enter__()
+    prev = PROF.switch("scan") if PROF is not None else None
+    try:
+        yield from _scan(refs, grid, transiting, state, adaptive, step_h, k0)
+    finally:
+        if PROF is not None: PROF.switch(prev)
+        if hook is not None: hook.__exit__(None, None, None)
+
+def _scan(refs, grid, transiting, state, adaptive, step_h, k0):
+    bidx = {pname: i for i, (_pid, pname) in enumerate(transiting)}
+    index = {pname: point_index(refs, pname) for _pid, pname in transiting}
+    key_r = {(pname, t, d, p): r for _pid, pname in transiting for r, (t, _k, d, p, _ref) in enumerate(refs)}
+    # открытые окна по телу (r) — их надо проверять, даже если точка вне диапазона
+    live = {pname: set() for _pid, pname in transiting}
+    for key, st in state.items():
+        if st.get("in") and key in key_r: live[key[0]].add(key_r[key])
+
+    def open_win(pname, tgt, deg, pol, jd):
+        state[(pname,tgt,deg,pol)] = {"in":True, "deg":deg, "pol":pol, "jd_start":jd, "min_orb":999, "jd_min":jd,
+                                      "span_h":24.0}
+
+    nxt = {pname: 0 for _,pname in transiting}    # индекс следующего замера тела
+    gap = {pname: 1 for _,pname in transiting}    # последний шаг тела (в шагах сетки)
+
+    k = 0
+    while k < len(grid) and refs:
+        jd = grid[k]
+        due = [(pid,pname) for pid,pname in transiting if nxt[pname] == k]
+        # позиции транзитных и кандидаты из индекса
+        tr_lons = {}
+        near = {}     # до ближайшей границы орба / точного аспекта
+        pairs = []
+        for pid,pname in due:
+            lon,spd = lon_planet(jd, pid)
+            tr_lons[pname]=(pid,lon,spd)
+            xs, rs, _lims, M = index[pname]
+            i0 = bisect.bisect_left(xs, lon - M); i1 = bisect.bisect_right(xs, lon + M)
+            # точки вне диапазона дальше M: до их границы не меньше (расстояние − M)
+            near[pname] = min(lon - xs[i0-1], xs[i1] - lon) - M
+            for r in set(rs[i0:i1]) | live[pname]:
+                pairs.append((r, bidx[pname], pid, pname))
+        pairs.sort()
+        new_min = {pname: [] for _,pname in due}
+        # цели × аспекты × полярности — только кандидаты, в порядке (ref, тело)
+        for r, _bi, pid, pname in pairs:
+            tgt, kind, deg, pol, ref_abs = refs[r]
+            plon = tr_lons[pname][1]
+            orb_now = abs(angdiff(plon, ref_abs))
+            lim = index[pname][2][r]
+            key = (pname, tgt, deg, pol)
+            st = state.get(key)
+            inside = orb_now <= lim
+            near[pname] = min(near[pname], abs(lim - orb_now), orb_now if inside else 360.0)
+            if inside:
+                if not st or not st.get("in"):
+                    open_win(pname, tgt, deg, pol, jd)
+                    live[pname].add(r)
+                    if PROF is not None: PROF.window(pname, "opened")
+                    st = state[key]
+                    st["min_orb"] = orb_now; st["jd_min"] = jd
+                    new_min[pname].append(st)
+                else:
+                    if orb_now < st["min_orb"]:
+                        st["min_orb"] = orb_now; st["jd_min"] = jd
+                        new_min[pname].append(st)
+            else:
+                if st and st.get("in"):
+                    state[key] = {"in":False}
+                    live[pname].discard(r)
+                    if PROF is not None:
+                        PROF.window(pname, "closed"); PROF.switch("other")   # потребитель окна
+                    yield {"key": key, "pid": pid, "ref": ref_abs, "jd_start": st["jd_start"], "jd_end": jd,
+                           "min_orb": st["min_orb"], "jd_min": st["jd_min"], "span_h": st["span_h"],
+                           "order": (k0 + k, r, bidx[pname])}
+                    if PROF is not None: PROF.switch("scan")
+        for pid,pname in due:
+            n = safe_steps(pname, tr_lons[pname][2], near[pname], step_h) if adaptive else 1
+            # пик ищем в пределах шагов, окружающих лучший замер
+            for st in new_min[pname]:
+                st["span_h"] = max(24.0, gap[pname]*step_h, n*step_h)
+            gap[pname] = n
+            nxt[pname] = k + n
+        k = min(nxt.values())
+
+def window_event(ctx, w):
+    pname, tgt, deg, _pol = w["key"]
+    return make_event(ctx, w["pid"], pname, tgt, deg, w["jd_start"], w["jd_end"], w["jd_min"], w["ref"], w["span_h"])
+
+def _shard_run(ephe, transiting_names, grid, k0, first, adaptive, points=None, prof=False):
+    """Рабочий процесс: свой set_ephe_path, скан своей части сетки.
+    Окна, открытые уже на первом шаге шарда (кроме первого шарда), и окна,
+    не закрывшиеся к концу, возвращаются «сырыми» для склейки."""
+    global TARGET_POINTS, PROF
+    TARGET_POINTS = points
+    PROF = enable_profile() if prof else None
+    swe.set_ephe_path(ephe)
+    open_ephem(ephe)
+    ctx = natal_context()
+    refs = aspect_refs(ctx["natal"], ctx["targets"])
+    transiting = [(BODIES[nm], nm) for nm in transiting_names]
+    state = {}
+    events, heads = [], []
+    for w in scan(refs, grid, transiting, state, adaptive, k0=k0):
+        if not first and w["jd_start"] == grid[0]:
+            heads.append(w)
+        else:
+            events.append((w["order"], window_event(ctx, w)))
+    ref_of = {(t, d, p): (r, ref) for r, (t, _k, d, p, ref) in enumerate(refs)}
+    tails = []
+    for key, st in state.items():
+        if not st.get("in"): continue
+        r, ref = ref_of[key[1:]]
+        tails.append({"key": key, "pid": BODIES[key[0]], "ref": ref, "jd_start": st["jd_start"], "jd_end": None,
+                      "min_orb": st["min_orb"], "jd_min": st["jd_min"], "span_h": st["span_h"],
+                      "head": not first and st["jd_start"] == grid[0]})
+    return events, heads, tails, (PROF.report() if PROF is not None else None)
+
+def _stitch(a, b):
+    """Окно a (хвост предыдущего шарда) + продолжение b с начала следующего."""
+    w = dict(b)
+    w["jd_start"] = a["jd_start"]
+    if a["min_orb"] <= b["min_orb"]:
+        w["min_orb"], w["jd_min"], w["span_h"] = a["min_orb"], a["jd_min"], a["span_h"]
+    return w
+
+def compute_sharded(start_local, end_local, transiting_names, workers, adaptive=True):
+    """Скан в пуле процессов: сетка режется на шарды с общим граничным шагом,
+    окна через границы склеиваются (start из первого шарда, end — из последнего,
+    пик — по лучшему замеру и заново уточняется)."""
+    from concurrent.futures import ProcessPoolExecutor
+    swe.set_ephe_path(EPHE)
+    t0, t1 = start_local, end_local
+    grid = time_grid(jd_utc(t0), jd_utc(t1))
+    n = max(1, min(workers, len(grid)//24 or 1))
+    bounds = [len(grid)*i//n for i in range(n+1)]
+    with ProcessPoolExecutor(max_workers=n) as ex:
+        futs = [ex.submit(_shard_run, EPHE, transiting_names, grid[bounds[i]:bounds[i+1]+1],
+                          bounds[i], i == 0, adaptive, TARGET_POINTS, PROF is not None) for i in range(n)]
+        parts = [f.result() for f in futs]
+
+    open_ephem(EPHE)
+    ctx = natal_context()
+    closed = []
+    carry = {}   # key -> окно, открытое на границе шардов
+    for events, heads, tails, rep in parts:
+        if rep is not None: PROF.merge(rep)
+        closed.extend(events)
+        for w in heads:
+            a = carry.pop(w["key"], None)
+            w = _stitch(a, w) if a else w
+            closed.append((w["order"], window_event(ctx, w)))
+        nxt_carry = {}
+        for w in tails:
+            a = carry.pop(w["key"], None) if w["head"] else None
+            nxt_carry[w["key"]] = _stitch(a, w) if a else w
+        carry = nxt_carry
+    closed.sort(key=lambda c: c[0])
+    results = [e for _, e in closed]
+    results.sort(key=lambda x: x["peak"])
+    return {"meta": make_meta(t0, t1, transiting_names), "events": results}
+
+def iter_events(start_local, end_local, transiting_names, adaptive=True, ordered=True):
+    """Генератор событий: окно отдаётся сразу после закрытия и уточнения пика,
+    память — только открытые окна. ordered=True включает буфер переупорядочивания:
+    событие выпускается, когда ни одно ещё не закрытое окно не может дать пик раньше,
+    поэтому порядок совпадает с сортировкой compute() по peak."""
+    swe.set_ephe_path(EPHE)
+    open_ephem(EPHE)
+
+    ctx = natal_context()
+    refs = aspect_refs(ctx["natal"], ctx["targets"])
+
+    # Сканирование
+    grid = time_grid(jd_utc(start_local), jd_utc(end_local))
+    # состояние: ключ (pname, target, deg, pol) -> окно
+    state = {}
+    transiting = [(BODIES[nm], nm) for nm in transiting_names]
+    # пик может лежать левее начала окна не дальше, чем на span поиска в refine_peak
+    margin = max(24.0, MAX_STEP_H if adaptive else 24.0)/24.0
+    buf = []; seq = 0
+    for w in scan(refs, grid, transiting, state, adaptive):
+        ev = window_event(ctx, w)
+        if not ordered:
+            yield ev; continue
+        heapq.heappush(buf, (ev["peak"], seq, ev)); seq += 1
+        low = min([w["jd_end"]] + [st["jd_start"] for st in state.values() if st.get("in")])
+        mark = jd_to_local(low - margin)
+        while buf and buf[0][0] < mark:
+            yield heapq.heappop(buf)[2]
+    while buf:
+        yield heapq.heappop(buf)[2]
+
+CHART_NAME = re.compile(r"\w[\w .-]*")
+
+def load_profiles(src):
+    """Профили чартов: каталог *.json/*.yaml (по файлу на чарт) или манифест —
+    список чартов либо {"charts": [...]}. Поля: name, birth, tz, lat, lon,
+    опционально cusps (12 или [None]+12), axes {ASC, MC} и points (путь к
+    natal_positions.yaml или {имя: долгота})."""
+    src = os.path.expanduser(src)
+    def read(path):
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(open(path, 'r', encoding='utf-8'))
+        return _json.load(open(path, 'r', encoding='utf-8'))
+    out = []
+    if os.path.isdir(src):
+        for fn in sorted(os.listdir(src)):
+            if not fn.endswith(('.json', '.yaml', '.yml')): continue
+            p = read(os.path.join(src, fn)) or {}
+            p.setdefault('name', os.path.splitext(fn)[0])
+            out.append(p)
+    else:
+        d = read(src)
+        items = d.get('charts', []) if isinstance(d, dict) else (d or [])
+        for i, p in enumerate(items):
+            p.setdefault('name', f"chart{i+1}")
+            out.append(p)
+    # имя чарта — имя файла результата в --out-dir: без путей, «..» и повторов
+    seen = set()
+    for p in out:
+        nm = str(p['name'])
+        if not CHART_NAME.fullmatch(nm):
+            raise SystemExit(f"Bad chart name {nm!r} in {src}: use letters, digits, '.', '_', '-', ' '")
+        if nm in seen: raise SystemExit(f"Duplicate chart name {nm!r} in {src}")
+        seen.add(nm); p['name'] = nm
+    return out
+
+def compute_batch(start_local, end_local, transiting_names, profiles, adaptive=True):
+    """Пакетный режим: один скан на все чарты — позиции транзитных считаются раз на шаг,
+    аспекты проверяются сразу против целей всех чартов. -> {name: {"meta","events"}}"""
+    swe.set_ephe_path(EPHE)
+    open_ephem(EPHE)
+
+    ctxs = [natal_context(p) for p in profiles]
+    # цель в ключе окна — (индекс чарта, имя точки)
+    refs = [((ci, tgt), kind, deg, pol, ref)
+            for ci, ctx in enumerate(ctxs) for tgt, kind, deg, pol, ref in aspect_refs(ctx["natal"], ctx["targets"])]
+    grid = time_grid(jd_utc(start_local), jd_utc(end_local))
+    state = {}
+    transiting = [(BODIES[nm], nm) for nm in transiting_names]
+    per_chart = [[] for _ in profiles]
+    for w in scan(refs, grid, transiting, state, adaptive):
+        pname, (ci, tgt), deg, _pol = w["key"]
+        per_chart[ci].append(make_event(ctxs[ci], w["pid"], pname, tgt, deg, w["jd_start"], w["jd_end"],
+                                        w["jd_min"], w["ref"], w["span_h"]))
+    out = {}
+    for p, results in zip(profiles, per_chart):
+        results.sort(key=lambda x: x["peak"])
+        meta = make_meta(start_local, end_local, transiting_names)
+        meta["chart"] = p['name']
+        out[p['name']] = {"meta": meta, "events": results}
+    return out
+
+def scan_key(ctx, transiting_names, adaptive):
+    """Ключ чекпойнта: натальная рамка, тела, эфемериды и режим шага."""
+    base = json.dumps({"natal": {k: round(v, 6) for k, v in ctx["natal"].items()},
+                       "cusps": [round(c, 6) for c in ctx["cusps"]],
+                       "bodies": list(transiting_names), "ephe": EPHE, "flags": FLAGS,
+                       "adaptive": bool(adaptive)}, sort_keys=True)
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()
+
+def load_checkpoint(path, key):
+    try:
+        ck = _json.load(open(path, 'r', encoding='utf-8'))
+    except Exception:
+        return None
+    return ck if isinstance(ck, dict) and ck.get("key") == key else None
+
+def save_checkpoint(path, ck):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(ck, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def compute_incremental(start_local, end_local, transiting_names, ck_path, adaptive=True):
+    """Скользящее окно: продолжает скан с последнего jd из чекпойнта (открытые окна
+    и уже закрытые события берутся оттуда), досчитывает только новый хвост и
+    отбрасывает события, закончившиеся до нового начала. Если чекпойнт не подходит
+    (другая рамка/тела/эфемериды, окно сдвинулось назад) — полный пересчёт."""
+    swe.set_ephe_path(EPHE)
+    open_ephem(EPHE)
+
+    ctx = natal_context()
+    refs = aspect_refs(ctx["natal"], ctx["targets"])
+    transiting = [(BODIES[nm], nm) for nm in transiting_names]
+    jd0, jd1 = jd_utc(start_local), jd_utc(end_local)
+    key = scan_key(ctx, transiting_names, adaptive)
+
+    ck = load_checkpoint(ck_path, key)
+    if ck and ck["jd_origin"] <= jd0 + 1e-9 and jd0 <= ck["jd_last"] <= jd1:
+        grid = time_grid(ck["jd_last"], jd1)[1:]
+        state = {tuple(k): st for k, st in ck["state"]}
+        closed = [c for c in ck["events"] if c["jd_end"] >= jd0]
+        jd_last = ck["jd_last"]
+    else:
+        grid = time_grid(jd0, jd1)
+        state = {}; closed = []; jd_last = None
+    print(f"[calc] {'resume' if jd_last else 'full'}: scan {len(grid)} steps, kept {len(closed)} events",
+          file=sys.stderr)
+
+    for w in scan(refs, grid, transiting, state, adaptive):
+        closed.append({"jd_end": w["jd_end"], "event": window_event(ctx, w)})
+    if grid: jd_last = grid[-1]
+    save_checkpoint(ck_path, {"key": key, "jd_origin": jd0, "jd_last": jd_last,
+                              "state": [[list(k), st] for k, st in state.items() if st.get("in")],
+                              "events": closed})
+    results = [c["event"] for c in closed]
+    results.sort(key=lambda x: x["peak"])
+    return {"meta": make_meta(start_local, end_local, transiting_names), "events": results}
+
+def compute(start_local, end_local, transiting_names, adaptive=True, workers=1):
+    if workers > 1:
+        return compute_sharded(start_local, end_local, transiting_names, workers, adaptive)
+    results = list(iter_events(start_local, end_local, transiting_names, adaptive))
+    return {"meta": make_meta(start_local, end_local, transiting_names), "events": results}
+
+NP_CHUNK = 8760  # шагов сетки на порцию (≈1 год по часу) — ограничивает память R×T
+
+def compute_np(start_local, end_local, transiting_names):
+    """Векторный движок: та же сетка и те же окна, что у compute(), но орбы
+    (время × тело × цель × аспект × полярность) считаются массивами numpy,
+    а открытия/закрытия окон — по переходам булевой маски."""
+    if np is None:
+        raise RuntimeError("numpy is required for the numpy engine")
+    swe.set_ephe_path(EPHE)
+    open_ephem(EPHE)
+
+    ctx = natal_context()
+    refs = aspect_refs(ctx["natal"], ctx["targets"])
+    ref_abs = np.array([r[4] for r in refs])
+
+    t0, t1 = start_local, end_local
+    jd0, jd1 = jd_utc(t0), jd_utc(t1)
+    step_h = 1.0
+    # сетку строим тем же накоплением, что и compute(), чтобы минуты совпадали
+    grid = np.array(time_grid(jd0, jd1, step_h))
+    prev_phase = PROF.switch("scan") if PROF is not None else None
+
+    closed = []  # (end_idx, ref_idx, body_idx, start_jd, end_jd, jd_min)
+    for bi, nm in enumerate(transiting_names):
+        pid = BODIES[nm]
+        lim = np.array([orb_v11(nm, r[1], r[2]) for r in refs])
+        prev = np.zeros(len(refs), dtype=bool)
+        # открытые окна, переходящие через границу порции: ref -> [start_jd, min_orb, jd_min]
+        carry = {}
+        for c0 in range(0, len(grid), NP_CHUNK):
+            jds = grid[c0:c0+NP_CHUNK]
+            lon = lon_many(jds, pid)
+            orb = np.abs((lon[None, :] - ref_abs[:, None] + 180.0) % 360.0 - 180.0)
+            ins = orb <= lim[:, None]
+            edges = np.diff(np.concatenate([prev[:, None], ins], axis=1).astype(np.int8), axis=1)
+            for r in np.flatnonzero(ins.any(axis=1) | prev):
+                r = int(r)
+                seg0 = 0 if r in carry else None
+                for t in np.flatnonzero(edges[r]):
+                    t = int(t)
+                    if edges[r, t] > 0:
+                        carry[r] = [jds[t], 999, jds[t]]; seg0 = t
+                        if PROF is not None: PROF.window(nm, "opened")
+                    else:
+                        w = carry.pop(r)
+                        k = seg0 + int(np.argmin(orb[r, seg0:t]))
+                        if orb[r, k] < w[1]: w[1], w[2] = orb[r, k], jds[k]
+                        closed.append((c0 + t, r, bi, w[0], jds[t], w[2]))
+                        if PROF is not None: PROF.window(nm, "closed")
+                        seg0 = None
+                if seg0 is not None and r in carry:
+                    w = carry[r]
+                    k = seg0 + int(np.argmin(orb[r, seg0:]))
+                    if orb[r, k] < w[1]: w[1], w[2] = orb[r, k], jds[k]
+            prev = ins[:, -1].copy()
+
+    if PROF is not None: PROF.switch(prev_phase)
+    # порядок закрытия как в compute(): шаг сетки, затем цель/аспект/полярность, затем тело
+    closed.sort(key=lambda c: c[:3])
+    results = []
+    for _, r, bi, start_jd, end_jd, jd_min in closed:
+        nm = transiting_names[bi]
+        tgt, _kind, deg, _pol, ref = refs[r]
+        results.append(make_event(ctx, BODIES[nm], nm, tgt, deg, float(start_jd), float(end_jd),
+                                  float(jd_min), ref))
+    results.sort(key=lambda x: x["peak"])
+    return {"meta": make_meta(t0, t1, transiting_names), "events": results}
 
 def main():
     ap = argparse.ArgumentParser(description="Transits (majors) with strict orbs v1.1 to personals+angles")
     ap.add_argument('--ephe', default=EPHE, help='Path to Swiss ephemeris')
     ap.add_argument('--bodies', default='Jupiter,Saturn,Uranus,Neptune,Pluto',
                     help='Comma-separated transiting bodies, e.g. Sun,Mercury,Venus,Jupiter,Saturn,Uranus,Neptune,Pluto')
+    ap.add_argument('--engine', choices=('loop','numpy'), default='loop',
+                    help='Scan engine: loop (per-step Python) or numpy (vectorized grid)')
+    ap.add_argument('--fixed-step', action='store_true',
+                    help='Loop engine: sample every body hourly instead of speed-aware adaptive steps')
+    ap.add_argument('--workers', type=int, default=1,
+                    help='Loop engine: split the range into N time shards scanned in worker processes')
+    ap.add_argument('--ndjson', action='store_true',
+                    help='Stream one JSON event per line as windows close (meta on the first line)')
+    ap.add_argument('--no-reorder', action='store_true',
+                    help='With --ndjson: emit in close order instead of buffering into peak order')
+    ap.add_argument('--state', metavar='PATH',
+                    help='Incremental mode: resume from / save scan checkpoint at PATH (rolling windows)')
+    ap.add_argument('--charts', metavar='SRC',
+                    help='Batch mode: directory or manifest of chart profiles; one scan for all charts')
+    ap.add_argument('--out-dir', default='.', help='Batch mode: where to write <chart>.json')
+    ap.add_argument('--points', metavar='YAML',
+                    help='Aspect targets from natal_positions.yaml (all points) instead of the 9 default targets')
+    ap.add_argument('--profile', action='store_true',
+                    help='Count ephemeris calls per phase/body, time phases, count windows; adds meta.perf '
+                         '(also GEODAC_PROFILE=1)')
+    ap.add_argument('--profile-hook', metavar='MOD:FUNC',
+                    help='Wrap the scan loop in the context manager returned by MOD.FUNC() (sampling profilers)')
     ap.add_argument('start', nargs='?', default='2025-09-10', help='Start date YYYY-MM-DD (local TZ)')
     ap.add_argument('end', nargs='?', default='2025-09-30', help='End date YYYY-MM-DD (local TZ)')
     args = ap.parse_args()
     swe.set_ephe_path(args.ephe)
+    global TARGET_POINTS, SCAN_HOOK
+    if args.profile or os.environ.get('GEODAC_PROFILE', '') not in ('', '0', 'no', 'off'):
+        enable_profile()
+    hook = args.profile_hook or os.environ.get('GEODAC_PROFILE_HOOK')
+    if hook:
+        SCAN_HOOK = load_hook(hook)
+    if args.points:
+        TARGET_POINTS = load_points(args.points)
     names = [s.strip() for s in args.bodies.split(',') if s.strip()]
     # валидация имён
     for nm in names:
@@ -245,7 +880,42 @@ def main():
             raise SystemExit(f"Unknown body: {nm}")
     t0 = TZ.localize(dt.datetime.fromisoformat(args.start + "T00:00"))
     t1 = TZ.localize(dt.datetime.fromisoformat(args.end   + "T23:59"))
-    data = compute(t0, t1, names)
+    if args.engine == 'numpy' and np is None:
+        raise SystemExit("--engine numpy requires numpy")
+    if args.charts:
+        if args.engine == 'numpy' or args.workers > 1 or args.state or args.ndjson:
+            raise SystemExit("--charts works with the single-process loop engine only")
+        profiles = load_profiles(args.charts)
+        if not profiles: raise SystemExit(f"No chart profiles in {args.charts}")
+        os.makedirs(os.path.expanduser(args.out_dir), exist_ok=True)
+        for name, data in compute_batch(t0, t1, names, profiles, adaptive=not args.fixed_step).items():
+            path = os.path.join(os.path.expanduser(args.out_dir), f"{name}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            print(f"[batch] {name}: {len(data['events'])} events -> {path}", file=sys.stderr)
+        return
+    if args.ndjson:
+        if args.engine == 'numpy' or args.workers > 1:
+            raise SystemExit("--ndjson streams from the single-process loop engine only")
+        print(json.dumps({"meta": make_meta(t0, t1, names)}, ensure_ascii=False), flush=True)
+        for ev in iter_events(t0, t1, names, adaptive=not args.fixed_step, ordered=not args.no_reorder):
+            print(json.dumps(ev, ensure_ascii=False), flush=True)
+        if PROF is not None:   # meta уже ушла первой строкой — профиль в stderr
+            print(json.dumps({"perf": PROF.report()}, ensure_ascii=False), file=sys.stderr)
+        return
+    if args.state:
+        if args.engine == 'numpy' or args.workers > 1:
+            raise SystemExit("--state works with the single-process loop engine only")
+        data = compute_incremental(t0, t1, names, os.path.expanduser(args.state), adaptive=not args.fixed_step)
+    elif args.engine == 'numpy':
+        data = compute_np(t0, t1, names)
+    else:
+        data = compute(t0, t1, names, adaptive=not args.fixed_step, workers=args.workers)
+    if PROF is not None:
+        p = data["meta"]["perf"]
+        calls = sum(d.get("calc_ut", {}).get("total", 0) for d in p["phases"].values())
+        print(f"[profile] {p['wall_s']}s calc_ut={calls} "
+              + " ".join(f"{ph}={d['time_s']}s" for ph, d in p["phases"].items()), file=sys.stderr)
     print(json.dumps(data, ensure_ascii=False, indent=2))
 
 if __name__ == "__main__":